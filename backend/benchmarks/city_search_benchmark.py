@@ -0,0 +1,70 @@
+"""
+City search benchmark: unanchored case-insensitive regex vs indexed
+normalized prefix/exact lookups.
+
+Seeds a scratch collection with properties spread over a few hundred
+cities, indexes ``city_normalized`` and times each strategy, reporting
+the documents/keys MongoDB examined. The regex has to examine every
+document; the normalized queries only touch the matching index range.
+
+    cd backend
+    python -m benchmarks.city_search_benchmark --documents 500000
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.common import BENCH_DATABASE, bench_client, examined, timed
+from services.city_search import city_filter, normalize_city
+
+BATCH_SIZE = 10_000
+CITY_STEMS = ["Austin", "Boston", "Denver", "Dallas", "Miami", "Phoenix", "Seattle", "Portland", "Montréal", "São Paulo"]
+
+
+async def seed(collection, documents: int) -> None:
+    await collection.drop()
+    rng = random.Random(7)
+    cities = [f"{stem} {n}" if n else stem for stem in CITY_STEMS for n in range(30)]
+    for start in range(0, documents, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, documents)):
+            city = rng.choice(cities)
+            batch.append({"title": f"Property {i}", "city": city, "city_normalized": normalize_city(city)})
+        await collection.insert_many(batch)
+    await collection.create_index([("city_normalized", 1), ("_id", 1)])
+
+
+async def run(args) -> None:
+    client = bench_client()
+    collection = client[BENCH_DATABASE].city_search
+    if not args.skip_seed:
+        print(f"Seeding {args.documents} documents...")
+        await seed(collection, args.documents)
+
+    term = args.term
+    strategies = [
+        ("regex (before)", {"city": {"$regex": term, "$options": "i"}}),
+        ("normalized prefix", city_filter(term)),
+        ("normalized exact", city_filter(term, exact=True)),
+    ]
+    print(f"{'strategy':<20} | {'ms':>9} {'matches':>8} {'docs':>9} {'keys':>9}")
+    for name, query in strategies:
+        elapsed = await timed(lambda: collection.find(query).limit(args.limit).to_list(args.limit), args.repeat)
+        matches = await collection.count_documents(query)
+        docs, keys = await examined(collection, query, limit=args.limit)
+        print(f"{name:<20} | {elapsed:>9.2f} {matches:>8} {docs:>9} {keys:>9}")
+    client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200_000)
+    parser.add_argument("--term", default="austin 1", help="City search term")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the previously seeded collection")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
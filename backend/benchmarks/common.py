@@ -0,0 +1,31 @@
+"""Shared helpers for the benchmark scripts (run them from backend/ with ``python -m``)"""
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BENCH_DATABASE = "real_estate_erp_bench"
+
+
+def bench_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    """Best-of-``repeat`` wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+async def examined(collection, query, sort=None, skip=0, limit=0):
+    """Documents and index keys MongoDB examined for a find"""
+    command = {"find": collection.name, "filter": query, "skip": skip, "limit": limit}
+    if sort:
+        command["sort"] = dict(sort)
+    plan = await collection.database.command({"explain": command, "verbosity": "executionStats"})
+    stats = plan["executionStats"]
+    return stats["totalDocsExamined"], stats["totalKeysExamined"]
@@ -0,0 +1,248 @@
+"""
+Synthetic data generator for load tests.
+
+Seeds properties, customers, sales, leases and finance records shaped
+like the API writes them (normalized city, GeoJSON location, datetimes),
+then applies the index registry and rebuilds the dashboard counters and
+finance rollups so the API serves the seeded data as it would in
+production. Field values are deterministic for a given ``--seed``
+(``_id`` values are not).
+
+``--scale`` is the number of properties. The other collections are
+sized from it by ``RATIOS``; anything from 10k to 10M works, in batches
+of ``--batch-size``.
+
+    cd backend
+    python -m benchmarks.datagen --scale 100000
+
+Uses MONGODB_URL (default mongodb://localhost:27017) and the throwaway
+``real_estate_erp_bench`` database; pass ``--database`` to change it.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from bson import ObjectId
+
+from benchmarks.common import BENCH_DATABASE, bench_client
+from services.agent_metrics import rebuild_metrics
+from services.city_search import normalize_city
+from services.dashboard_counters import rebuild_counters
+from services.finance_rollups import rebuild_rollups
+from services.geo_search import location_from
+from services.indexes import ensure_indexes
+
+BATCH_SIZE = 10_000
+# Documents per property
+RATIOS = {"customers": 0.5, "sales": 0.1, "leases": 0.1, "finance_records": 0.5}
+AGENT_COUNT = 50
+HISTORY_DAYS = 730
+
+CITIES = [
+    ("Austin", "TX", 30.27, -97.74), ("Dallas", "TX", 32.78, -96.80), ("Houston", "TX", 29.76, -95.37),
+    ("Denver", "CO", 39.74, -104.99), ("Phoenix", "AZ", 33.45, -112.07), ("Seattle", "WA", 47.61, -122.33),
+    ("Portland", "OR", 45.52, -122.68), ("Miami", "FL", 25.76, -80.19), ("Boston", "MA", 42.36, -71.06),
+    ("Atlanta", "GA", 33.75, -84.39), ("Chicago", "IL", 41.88, -87.63), ("San José", "CA", 37.34, -121.89),
+]
+PROPERTY_TYPES = ["residential", "residential", "residential", "commercial", "land", "industrial"]
+PROPERTY_STATUSES = ["available", "available", "available", "sold", "leased", "off_market", "under_contract"]
+AMENITIES = ["pool", "garden", "garage", "gym", "balcony", "fireplace", "elevator", "solar panels", "security"]
+ADJECTIVES = ["Bright", "Spacious", "Modern", "Renovated", "Quiet", "Historic", "Sunny", "Cozy"]
+NOUNS = ["loft", "townhouse", "bungalow", "condo", "office", "warehouse", "villa", "duplex"]
+DEAL_STATUSES = ["prospecting", "qualification", "proposal", "negotiation", "closing", "closed", "closed", "lost"]
+EXPENSE_CATEGORIES = ["maintenance", "marketing", "utilities", "insurance", "taxes"]
+
+
+def agent_id(rng: random.Random) -> str:
+    return f"agent-{rng.randrange(AGENT_COUNT):03d}"
+
+
+def moment(rng: random.Random, now: datetime) -> datetime:
+    return (now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))).replace(microsecond=0)
+
+
+def midnight(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0)
+
+
+def make_property(rng: random.Random, i: int, now: datetime) -> Dict[str, Any]:
+    city, state, lat, lng = rng.choice(CITIES)
+    created = moment(rng, now)
+    doc = {
+        "_id": ObjectId(),
+        "title": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} #{i}",
+        "description": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} close to downtown {city}. " * rng.randint(1, 4),
+        "property_type": rng.choice(PROPERTY_TYPES),
+        "status": rng.choice(PROPERTY_STATUSES),
+        "price": float(rng.randrange(50_000, 3_000_000, 500)),
+        "area": float(rng.randrange(400, 12_000)),
+        "bedrooms": rng.randint(0, 6),
+        "bathrooms": rng.randint(1, 8) / 2,
+        "address": f"{rng.randint(1, 9999)} {rng.choice(['Main', 'Oak', 'Pine', 'Elm', 'Lake'])} St",
+        "city": city,
+        "state": state,
+        "zip_code": f"{rng.randint(10000, 99999)}",
+        "country": "USA",
+        "latitude": round(lat + rng.uniform(-0.25, 0.25), 6),
+        "longitude": round(lng + rng.uniform(-0.25, 0.25), 6),
+        "amenities": rng.sample(AMENITIES, rng.randint(0, 4)),
+        "images": [f"https://img.example.com/{i}/{n}.jpg" for n in range(rng.randint(0, 6))],
+        "year_built": rng.randint(1900, 2024),
+        "parking_spaces": rng.randint(0, 4),
+        "listing_agent_id": agent_id(rng),
+        "external_id": f"mls-{i}",
+        "created_at": created,
+        "updated_at": created,
+    }
+    doc["city_normalized"] = normalize_city(city)
+    doc["location"] = location_from(doc)
+    return doc
+
+
+def make_customer(rng: random.Random, i: int, now: datetime) -> Dict[str, Any]:
+    city, state, _, _ = rng.choice(CITIES)
+    budget_min = float(rng.randrange(50_000, 1_500_000, 5_000))
+    created = moment(rng, now)
+    return {
+        "_id": ObjectId(),
+        "first_name": rng.choice(["Ana", "Ben", "Chloé", "Dev", "Eli", "Fatima", "Gus", "Hana"]),
+        "last_name": f"{rng.choice(['Lee', 'Smith', 'García', 'Nguyen', 'Okafor', 'Rossi'])}{i}",
+        "email": f"customer{i}@example.com",
+        "phone": f"+1555{i:07d}"[-11:],
+        "city": city,
+        "state": state,
+        "annual_income": float(rng.randrange(30_000, 500_000, 1_000)),
+        "credit_score": rng.randint(300, 850),
+        "preferred_property_type": rng.choice(PROPERTY_TYPES),
+        "budget_min": budget_min,
+        "budget_max": budget_min * rng.uniform(1.2, 2.5),
+        "lead_source": rng.choice(["web", "referral", "open house", "ads"]),
+        "assigned_agent_id": agent_id(rng),
+        "external_id": f"crm-{i}",
+        "created_at": created,
+        "updated_at": created,
+    }
+
+
+def make_sale(rng: random.Random, i: int, now: datetime) -> Dict[str, Any]:
+    closing = moment(rng, now)
+    price = float(rng.randrange(80_000, 3_000_000, 500))
+    rate = rng.choice([0.025, 0.03, 0.05])
+    return {
+        "_id": ObjectId(),
+        "property_id": str(ObjectId()),
+        "customer_id": str(ObjectId()),
+        "agent_id": agent_id(rng),
+        "sale_price": price,
+        "commission_rate": rate,
+        "commission_amount": round(price * rate, 2),
+        "closing_date": midnight(closing),
+        "contract_date": midnight(closing - timedelta(days=rng.randint(15, 90))),
+        "status": rng.choice(DEAL_STATUSES),
+        "external_id": f"sale-{i}",
+        "created_at": closing,
+        "updated_at": closing,
+    }
+
+
+def make_lease(rng: random.Random, i: int, now: datetime) -> Dict[str, Any]:
+    start = midnight(moment(rng, now))
+    months = rng.choice([6, 12, 12, 24])
+    return {
+        "_id": ObjectId(),
+        "property_id": str(ObjectId()),
+        "tenant_id": str(ObjectId()),
+        "agent_id": agent_id(rng),
+        "monthly_rent": float(rng.randrange(800, 15_000, 25)),
+        "security_deposit": float(rng.randrange(800, 30_000, 100)),
+        "lease_start": start,
+        "lease_end": start + timedelta(days=30 * months),
+        "lease_term_months": months,
+        "utilities_included": rng.sample(["water", "gas", "electricity", "internet"], rng.randint(0, 2)),
+        "parking_included": rng.random() < 0.5,
+        "status": "active" if start + timedelta(days=30 * months) > now else "expired",
+        "external_id": f"lease-{i}",
+        "created_at": start,
+        "updated_at": start,
+    }
+
+
+def make_finance_record(rng: random.Random, i: int, now: datetime) -> Dict[str, Any]:
+    when = moment(rng, now)
+    income = rng.random() < 0.6
+    return {
+        "_id": ObjectId(),
+        "type": "income" if income else "expense",
+        "category": rng.choice(["commission", "rent"]) if income else rng.choice(EXPENSE_CATEGORIES),
+        "amount": float(rng.randrange(100, 60_000, 5)),
+        "description": f"Record {i}",
+        "date": midnight(when),
+        "agent_id": agent_id(rng),
+        "external_id": f"fin-{i}",
+        "created_at": when,
+    }
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int, datetime], Dict[str, Any]]] = {
+    "properties": make_property,
+    "customers": make_customer,
+    "sales": make_sale,
+    "leases": make_lease,
+    "finance_records": make_finance_record,
+}
+
+
+def collection_sizes(scale: int) -> Dict[str, int]:
+    return {"properties": scale, **{name: max(int(scale * ratio), 1) for name, ratio in RATIOS.items()}}
+
+
+def generate(name: str, count: int, seed: int, now: datetime) -> Iterator[Dict[str, Any]]:
+    # One RNG per collection, so changing one ratio does not reshuffle the others
+    rng = random.Random(f"{seed}:{name}")
+    make = GENERATORS[name]
+    for i in range(count):
+        yield make(rng, i, now)
+
+
+async def seed_database(db, scale: int, seed: int = 42, batch_size: int = BATCH_SIZE,
+                        now: Optional[datetime] = None) -> Dict[str, int]:
+    """Replace the benchmark collections with generated data; returns the sizes"""
+    now = now or datetime.utcnow()
+    sizes = collection_sizes(scale)
+    for name, count in sizes.items():
+        await db[name].drop()
+        started = time.perf_counter()
+        batch = []
+        for doc in generate(name, count, seed, now):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await db[name].insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await db[name].insert_many(batch, ordered=False)
+        print(f"  {name:<16} {count:>10,} documents in {time.perf_counter() - started:.1f}s")
+    await db.dashboard_counters.drop()
+    await ensure_indexes(db)
+    await rebuild_counters(db)
+    await rebuild_rollups(db)
+    await rebuild_metrics(db)
+    return sizes
+
+
+async def _main(args) -> None:
+    client = bench_client()
+    print(f"Seeding {args.database} at scale {args.scale:,}...")
+    await seed_database(client[args.database], args.scale, args.seed, args.batch_size)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10_000, help="Number of properties (10k to 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database", default=BENCH_DATABASE)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,292 @@
+"""
+API load test.
+
+Replays a weighted mix of dashboard, filtered list, keyset page, detail
+and create requests with a fixed number of concurrent clients, then
+reports throughput and p50/p95/p99 latency per endpoint. Results can be
+stored as a named baseline and later runs diffed against it; the exit
+status is 1 when any endpoint's p95 regressed beyond ``--threshold``.
+
+Targets, in order of realism:
+
+    # a running server (python serve.py) and its database
+    python -m benchmarks.load_test --base-url http://localhost:8000
+
+    # the app in-process against a local mongod, seeded first
+    python -m benchmarks.datagen --scale 100000
+    python -m benchmarks.load_test --requests 20000 --save-baseline main
+
+    # the app in-process against an in-memory stand-in (needs mongomock-motor)
+    python -m benchmarks.load_test --memory --seed-scale 10000 --compare main
+
+In-process runs use MONGODB_URL and the ``real_estate_erp_bench``
+database unless MONGODB_DATABASE is set. The in-memory stand-in is only
+good for comparing Python-side costs (routing, validation,
+serialization); its query engine is nothing like MongoDB's.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import BENCH_DATABASE
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+ID_SAMPLE_SIZE = 500
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]  # method, path, JSON body
+
+
+def property_body(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "title": f"Load test listing {rng.randrange(10**9)}",
+        "property_type": rng.choice(["residential", "commercial"]),
+        "status": "available",
+        "price": float(rng.randrange(100_000, 2_000_000, 1_000)),
+        "area": float(rng.randrange(500, 5_000)),
+        "address": "1 Bench St",
+        "city": rng.choice(["Austin", "Denver", "Seattle"]),
+        "state": "TX",
+        "zip_code": "78701",
+        "latitude": 30.27,
+        "longitude": -97.74,
+        "amenities": ["pool"],
+        "external_id": f"bench-{uuid.uuid4()}",
+    }
+
+
+def sale_body(rng: random.Random) -> Dict[str, Any]:
+    closing = datetime.utcnow().date() - timedelta(days=rng.randrange(60))
+    price = float(rng.randrange(100_000, 2_000_000, 1_000))
+    return {
+        "property_id": "bench",
+        "customer_id": "bench",
+        "agent_id": f"agent-{rng.randrange(50):03d}",
+        "sale_price": price,
+        "commission_rate": 0.03,
+        "commission_amount": price * 0.03,
+        "closing_date": closing.isoformat(),
+        "contract_date": (closing - timedelta(days=30)).isoformat(),
+        "external_id": f"bench-{uuid.uuid4()}",
+    }
+
+
+def filtered_list(rng: random.Random, ids) -> Request:
+    low = rng.randrange(100_000, 1_000_000, 50_000)
+    return "GET", (f"/api/properties?status=available&property_type=residential"
+                   f"&min_price={low}&max_price={low * 2}&limit=50"), None
+
+
+# name -> (weight, request factory)
+MIX: Dict[str, Tuple[int, Callable[[random.Random, Dict[str, List[str]]], Request]]] = {
+    "dashboard": (10, lambda rng, ids: ("GET", "/api/dashboard/stats", None)),
+    "properties: filtered list": (25, filtered_list),
+    "properties: keyset page": (10, lambda rng, ids: ("GET", "/api/properties?cursor=&sort=price&limit=50&fields=card", None)),
+    "properties: city prefix": (5, lambda rng, ids: ("GET", f"/api/properties?city={rng.choice(['aus', 'den', 'sea'])}&limit=20", None)),
+    "properties: detail": (25, lambda rng, ids: ("GET", f"/api/properties/{rng.choice(ids['properties'])}", None)),
+    "customers: detail": (10, lambda rng, ids: ("GET", f"/api/customers/{rng.choice(ids['customers'])}", None)),
+    "customers: list": (5, lambda rng, ids: ("GET", "/api/customers?limit=50&fields=summary", None)),
+    "properties: create": (5, lambda rng, ids: ("POST", "/api/properties", property_body(rng))),
+    "sales: create": (5, lambda rng, ids: ("POST", "/api/sales", sale_body(rng))),
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Linear interpolation between the closest ranks"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples: Dict[str, List[Tuple[float, int]]], elapsed: float) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for name, results in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in results)
+        report[name] = {
+            "requests": len(results),
+            "errors": sum(1 for _, status in results if status >= 400),
+            "rps": len(results) / elapsed,
+            "mean_ms": statistics.fmean(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        }
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, float]], elapsed: float) -> None:
+    total = sum(row["requests"] for row in report.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s)")
+    print(f"{'endpoint':<28} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in report.items():
+        print(f"{name:<28} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+def compare(report: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print the change against a baseline; True if any p95 regressed beyond ``threshold``"""
+    regressed = False
+    print(f"\nAgainst baseline '{baseline['name']}' ({baseline['meta']['recorded_at']}):")
+    print(f"{'endpoint':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9}")
+    for name, row in report.items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            print(f"{name:<28} (new)")
+            continue
+        change = {key: (row[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                  for key in ("p50_ms", "p95_ms", "p99_ms", "rps")}
+        flag = ""
+        if change["p95_ms"] > threshold:
+            regressed = True
+            flag = "  REGRESSED"
+        print(f"{name:<28} {change['p50_ms']:>+8.1f}% {change['p95_ms']:>+8.1f}% "
+              f"{change['p99_ms']:>+8.1f}% {change['rps']:>+8.1f}%{flag}")
+    return regressed
+
+
+async def sample_ids(client: httpx.AsyncClient) -> Dict[str, List[str]]:
+    ids = {}
+    for collection in ("properties", "customers"):
+        response = await client.get(f"/api/{collection}?limit={ID_SAMPLE_SIZE}&fields=id")
+        response.raise_for_status()
+        ids[collection] = [doc["id"] for doc in response.json()]
+        if not ids[collection]:
+            raise SystemExit(f"No {collection} to request; seed the database first (benchmarks.datagen)")
+    return ids
+
+
+async def login(client: httpx.AsyncClient) -> None:
+    response = await client.post("/api/auth/login", json={
+        "username": os.getenv("BENCH_USERNAME", "admin"),
+        "password": os.getenv("BENCH_PASSWORD", "admin123"),
+    })
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+async def run_load(client: httpx.AsyncClient, ids: Dict[str, List[str]], total: int, concurrency: int,
+                   seed: int, warmup: int) -> Tuple[Dict[str, List[Tuple[float, int]]], float]:
+    names = list(MIX)
+    weights = [MIX[name][0] for name in names]
+    samples: Dict[str, List[Tuple[float, int]]] = {name: [] for name in names}
+    issued = 0
+
+    async def worker(number: int) -> None:
+        nonlocal issued
+        rng = random.Random(f"{seed}:{number}")
+        while issued < total + warmup:
+            issued += 1
+            measured = issued > warmup
+            name = rng.choices(names, weights)[0]
+            method, path, body = MIX[name][1](rng, ids)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            elapsed = time.perf_counter() - started
+            if measured:
+                samples[name].append((elapsed, response.status_code))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return {name: results for name, results in samples.items() if results}, time.perf_counter() - started
+
+
+def in_process_client(args) -> httpx.AsyncClient:
+    os.environ.setdefault("MONGODB_DATABASE", BENCH_DATABASE)
+    if args.seed_scale:
+        # Seeding applies the indexes itself
+        os.environ.setdefault("ENSURE_INDEXES_ON_STARTUP", "false")
+    if args.memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--memory needs the mongomock-motor package")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+        # The stand-in has no change streams
+        os.environ.setdefault("EVENTS_SOURCE", "polling")
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout)
+
+
+async def run(args) -> int:
+    async with AsyncExitStack() as stack:
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        else:
+            client = in_process_client(args)
+            import main
+            # The transport does not send lifespan events, so open the database as a worker would
+            await stack.enter_async_context(main.lifespan(main.app))
+            if args.seed_scale:
+                from benchmarks.datagen import seed_database
+
+                print(f"Seeding at scale {args.seed_scale:,}...")
+                await seed_database(main.db, args.seed_scale, args.seed)
+
+        async with client:
+            await login(client)
+            ids = await sample_ids(client)
+            print(f"Running {args.requests} requests ({args.warmup} warm-up) with {args.concurrency} clients...")
+            samples, elapsed = await run_load(client, ids, args.requests, args.concurrency, args.seed, args.warmup)
+
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed)
+
+    status = 0
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        status = 1 if compare(report, baseline, args.threshold) else 0
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        meta = {
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "target": args.base_url or ("memory" if args.memory else "in-process"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "seed_scale": args.seed_scale,
+        }
+        path.write_text(json.dumps({"name": args.save_baseline, "meta": meta, "endpoints": report}, indent=2) + "\n")
+        print(f"\nBaseline saved to {path}")
+    return status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Load a running server instead of the app in-process")
+    parser.add_argument("--memory", action="store_true", help="In-process against an in-memory stand-in")
+    parser.add_argument("--seed-scale", type=int, default=0, help="Seed this many properties first (in-process only)")
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Diff against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed p95 regression in percent")
+    args = parser.parse_args()
+    if args.memory and not args.seed_scale:
+        parser.error("--memory starts empty, pass --seed-scale")
+    if args.base_url and (args.memory or args.seed_scale):
+        parser.error("--memory and --seed-scale only apply to in-process runs")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Skip/limit vs keyset pagination benchmark.
+
+Seeds a scratch collection with synthetic properties, then fetches a page
+at increasing depths with both strategies and reports wall time and the
+number of documents/keys MongoDB examined (from ``explain``). Skip cost
+grows with depth; keyset cost stays flat.
+
+    cd backend
+    python -m benchmarks.pagination_benchmark --documents 200000 --sort price
+
+Uses MONGODB_URL (default mongodb://localhost:27017) and a throwaway
+``real_estate_erp_bench`` database.
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.common import BENCH_DATABASE, bench_client, examined, timed
+from services.pagination import keyset_filter, parse_sort
+
+BATCH_SIZE = 10_000
+
+
+async def seed(collection, documents: int) -> None:
+    await collection.drop()
+    rng = random.Random(42)
+    for start in range(0, documents, BATCH_SIZE):
+        await collection.insert_many([
+            {"title": f"Property {i}", "price": rng.randint(50_000, 2_000_000), "status": "available"}
+            for i in range(start, min(start + BATCH_SIZE, documents))
+        ])
+    await collection.create_index([("price", 1), ("_id", 1)])
+
+
+async def run(args) -> None:
+    client = bench_client()
+    collection = client[BENCH_DATABASE].pagination
+    if not args.skip_seed:
+        print(f"Seeding {args.documents} documents...")
+        await seed(collection, args.documents)
+
+    sort_spec = parse_sort(args.sort, [args.sort.lstrip("+-")] if args.sort else [])
+    print(f"{'depth':>10} | {'skip ms':>9} {'docs':>8} {'keys':>8} | {'keyset ms':>9} {'docs':>8} {'keys':>8}")
+    for depth in args.depths:
+        if depth >= args.documents:
+            continue
+        # The document just before the page gives the keyset resume point
+        anchor = await collection.find({}).sort(sort_spec).skip(depth - 1).limit(1).to_list(1) if depth else []
+        keyset_query = keyset_filter(sort_spec, [anchor[0].get(f) for f, _ in sort_spec]) if anchor else {}
+
+        skip_ms = await timed(
+            lambda: collection.find({}).sort(sort_spec).skip(depth).limit(args.page_size).to_list(args.page_size),
+            args.repeat,
+        )
+        keyset_ms = await timed(
+            lambda: collection.find(keyset_query).sort(sort_spec).limit(args.page_size).to_list(args.page_size),
+            args.repeat,
+        )
+        skip_docs, skip_keys = await examined(collection, {}, sort_spec, depth, args.page_size)
+        keyset_docs, keyset_keys = await examined(collection, keyset_query, sort_spec, 0, args.page_size)
+        print(f"{depth:>10} | {skip_ms:>9.2f} {skip_docs:>8} {skip_keys:>8} | "
+              f"{keyset_ms:>9.2f} {keyset_docs:>8} {keyset_keys:>8}")
+    client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--sort", default="price", help='Sort key, e.g. "price", "-price" or "" for _id')
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 50_000, 90_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the previously seeded collection")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
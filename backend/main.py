@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Response, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, create_model
+from pydantic.fields import FieldInfo
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, date, timedelta
 from enum import Enum
 import uvicorn
@@ -10,9 +12,49 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from bson import ObjectId
 import json
-from jose import JWTError, jwt
+from jose import jwt
 from passlib.context import CryptContext
 import secrets
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import partial
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from services import agent_metrics, background, dashboard_counters, finance_rollups
+from services.background import run_periodically
+from services.auth import InvalidToken, PasswordHasher, TokenCache, decode_token
+from services.bulk_write import bulk_write_documents, parse_items
+from services import conditional, metrics
+from services.city_search import backfill_city_normalized, city_filter, normalize_city, suggest_cities
+from services.dashboard_stats import compute_dashboard_stats
+from services.document_cache import DocumentCache, shared_backend_from_url
+from services.events import EventHub, feed_forever, format_event
+from services.export import stream_csv, stream_ndjson
+from services.geo_search import (
+    InvalidShape, backfill_locations, bbox_polygon, location_from, nearest_page, parse_polygon, point, polygon_center, within_filter
+)
+from services.indexes import check_query_plans, ensure_indexes
+from services import lease_scheduler, matching
+from services.pagination import InvalidPageRequest, fetch_page, parse_sort
+from services.projection import InvalidProjection, parse_fields, project
+from services.property_search import InvertedIndex, memory_search, mongo_text_search
+from services.serialization import JSONBytesResponse, document_response, documents_response, page_response
+from services.ttl_cache import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Per worker: connect and warm the pool, run background jobs, then shut down cleanly"""
+    await open_database()
+    start_background_jobs()
+    try:
+        yield
+    finally:
+        await stop_background_jobs()
+        client.close()
+        password_hasher.shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -20,7 +62,8 @@ app = FastAPI(
     description="Comprehensive Real Estate Management Platform",
     version="2.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -32,8 +75,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Instrumentation: /api/metrics, slow-query log, X-Profile: 1 timing breakdown
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# The breakdown names collections and commands, so it is opt-in (development, staging)
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() == "true"
+app.add_middleware(metrics.MetricsMiddleware, allow_profiling=REQUEST_PROFILING)
+
 # Security Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    # Development only: tokens signed with a per-process key fail on other workers and after a restart
+    SECRET_KEY = secrets.token_urlsafe(32)
+    logger.warning("SECRET_KEY is not set; using a random key for this process")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
@@ -41,11 +94,77 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 security = HTTPBearer()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs on its own threads, so logins never block the event loop
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+# Demo login; set ADMIN_PASSWORD_HASH (a bcrypt hash) to avoid a plaintext password in the environment
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD_HASH = os.getenv("ADMIN_PASSWORD_HASH")
+password_hasher = PasswordHasher(pwd_context, AUTH_HASH_WORKERS)
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL_SECONDS)
 
-# MongoDB connection
+# MongoDB connection, opened per worker by the lifespan handler (open_database)
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.real_estate_erp
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "real_estate_erp")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+# How long a request waits for a free pooled connection before failing; 0 waits indefinitely
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+# Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need their Python packages)
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "")
+client = None
+db = None
+
+# Index provisioning and backfills
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "true").lower() == "true"
+
+# Finance rollups are kept up to date by writes; the periodic rebuild corrects drift
+FINANCE_ROLLUP_REBUILD_SECONDS = float(os.getenv("FINANCE_ROLLUP_REBUILD_SECONDS", "3600"))
+
+# Agent metrics are kept up to date by writes; the periodic rebuild corrects drift
+AGENT_METRICS_REBUILD_SECONDS = float(os.getenv("AGENT_METRICS_REBUILD_SECONDS", "3600"))
+
+# Lease expiry and renewal queue
+LEASE_SCHEDULER_SECONDS = float(os.getenv("LEASE_SCHEDULER_SECONDS", "3600"))
+LEASE_RENEWAL_NOTICE_DAYS = int(os.getenv("LEASE_RENEWAL_NOTICE_DAYS", "60"))
+LEASE_SCHEDULER_BATCH_SIZE = int(os.getenv("LEASE_SCHEDULER_BATCH_SIZE", "1000"))
+
+# Customer-property matching on an in-memory snapshot of available listings
+MATCHING_REFRESH_SECONDS = float(os.getenv("MATCHING_REFRESH_SECONDS", "600"))
+property_matcher = matching.PropertySnapshot()
+
+# Full-text search: "mongo" (text index) or "memory" (in-process inverted index)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "mongo")
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+property_search_index = InvertedIndex()
+
+# Dashboard caching
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "5"))
+DASHBOARD_RECONCILE_SECONDS = float(os.getenv("DASHBOARD_RECONCILE_SECONDS", "900"))
+dashboard_cache = AsyncTTLCache(ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+# Server-sent change events
+EVENT_COLLECTIONS = ("properties", "sales", "leases", "finance_records")
+EVENTS_DEBOUNCE_SECONDS = float(os.getenv("EVENTS_DEBOUNCE_SECONDS", "1"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# "auto" (change stream, polling fallback) or "polling"
+EVENTS_SOURCE = os.getenv("EVENTS_SOURCE", "auto")
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "2"))
+event_hub = EventHub(debounce=EVENTS_DEBOUNCE_SECONDS)
+
+# Read-through cache for single-record GETs
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "5000"))
+DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "30"))
+# Optional shared tier: "redis://host:6379/0", or "memory://" as a local stand-in
+DOCUMENT_CACHE_URL = os.getenv("DOCUMENT_CACHE_URL", "")
+document_cache_backend = shared_backend_from_url(DOCUMENT_CACHE_URL)
+property_cache = None
+customer_cache = None
+
+# Bulk export / import
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+MAX_BULK_ITEMS = int(os.getenv("MAX_BULK_ITEMS", "10000"))
 
 # Enums
 class PropertyType(str, Enum):
@@ -79,6 +198,10 @@ class DealStatus(str, Enum):
     CLOSED = "closed"
     LOST = "lost"
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
 # Pydantic Models
 class PropertyBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
@@ -104,6 +227,7 @@ class PropertyBase(BaseModel):
     hoa_fee: Optional[float] = Field(None, ge=0)
     property_tax: Optional[float] = Field(None, ge=0)
     listing_agent_id: Optional[str] = None
+    external_id: Optional[str] = None  # ID in the source system (MLS, accounting)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -129,6 +253,7 @@ class CustomerBase(BaseModel):
     notes: Optional[str] = None
     lead_source: Optional[str] = None
     assigned_agent_id: Optional[str] = None
+    external_id: Optional[str] = None  # ID in the source system (MLS, accounting)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -146,6 +271,7 @@ class SaleBase(BaseModel):
     contract_date: date
     status: DealStatus = DealStatus.PROSPECTING
     notes: Optional[str] = None
+    external_id: Optional[str] = None  # ID in the source system (MLS, accounting)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -166,6 +292,7 @@ class LeaseBase(BaseModel):
     parking_included: bool = False
     status: str = "active"  # active, expired, terminated
     notes: Optional[str] = None
+    external_id: Optional[str] = None  # ID in the source system (MLS, accounting)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -182,11 +309,28 @@ class FinanceRecordBase(BaseModel):
     customer_id: Optional[str] = None
     agent_id: Optional[str] = None
     receipt_url: Optional[str] = None
+    external_id: Optional[str] = None  # ID in the source system (MLS, accounting)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class FinanceRecord(FinanceRecordBase):
     id: str = Field(alias="_id")
 
+# Partial models for PATCH: every field optional, same validation when present
+SERVER_MANAGED_FIELDS = ("created_at", "updated_at")
+
+def partial_model(model):
+    fields = {
+        name: (field.annotation, FieldInfo.merge_field_infos(field, default=None))
+        for name, field in model.model_fields.items()
+        if name not in SERVER_MANAGED_FIELDS
+    }
+    return create_model(model.__name__.replace("Base", "Patch"), **fields)
+
+PropertyPatch = partial_model(PropertyBase)
+CustomerPatch = partial_model(CustomerBase)
+SalePatch = partial_model(SaleBase)
+LeasePatch = partial_model(LeaseBase)
+
 # Authentication Models
 class UserLogin(BaseModel):
     username: str
@@ -199,6 +343,10 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+class CursorPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
 class DashboardStats(BaseModel):
     total_properties: int
     available_properties: int
@@ -217,11 +365,17 @@ class DashboardStats(BaseModel):
     recent_transactions: List[Dict[str, Any]]
 
 # Authentication Helper Functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
+
+async def admin_password_hash():
+    global ADMIN_PASSWORD_HASH
+    if ADMIN_PASSWORD_HASH is None:
+        ADMIN_PASSWORD_HASH = await get_password_hash(os.getenv("ADMIN_PASSWORD", "admin123"))
+    return ADMIN_PASSWORD_HASH
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -240,14 +394,10 @@ async def get_current_user_from_token(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+        payload = decode_token(token, SECRET_KEY, ALGORITHM, token_cache)
+    except InvalidToken:
         raise credentials_exception
-    return token_data
+    return TokenData(username=payload["sub"])
 
 # Helper functions
 def serialize_doc(doc):
@@ -272,25 +422,251 @@ def serialize_doc(doc):
         return result
     return doc
 
-# Authentication dependency (simplified for demo)
+def to_mongo_value(value):
+    if isinstance(value, Enum):
+        # Derived data compares and keys on plain values
+        return value.value
+    if isinstance(value, date) and not isinstance(value, datetime):
+        # BSON only stores datetimes
+        return datetime.combine(value, datetime.min.time())
+    return value
+
+def to_mongo_doc(doc):
+    """Plain values for storage: enum members become their values, dates datetimes"""
+    return {key: to_mongo_value(value) for key, value in doc.items()}
+
+# Fields each list endpoint accepts in its ``sort`` parameter
+PROPERTY_SORT_FIELDS = ("price", "area", "created_at", "updated_at")
+CUSTOMER_SORT_FIELDS = ("last_name", "created_at", "updated_at")
+SALE_SORT_FIELDS = ("sale_price", "closing_date", "created_at")
+LEASE_SORT_FIELDS = ("monthly_rent", "lease_end", "created_at")
+RENEWAL_SORT_FIELDS = ("lease_end", "queued_at")
+FINANCE_SORT_FIELDS = ("amount", "date", "created_at")
+
+async def list_documents(collection, query, skip, limit, sort, cursor, sort_fields, projection=None, request=None):
+    """
+    Page through a collection.
+
+    Without ``cursor`` this is the legacy skip/limit listing returning a
+    plain array. Passing ``cursor`` (empty for the first page) switches to
+    keyset pagination and returns a CursorPage envelope whose
+    ``next_cursor`` fetches the following page. ``projection`` limits the
+    fields read and returned.
+
+    With ``request`` the response carries validators derived from the
+    collection's change marker and the query string, and a matching
+    conditional request gets 304 before the collection is queried.
+    """
+    if request is not None:
+        seq, changed_at = await conditional.read_marker(db, collection.name)
+        etag = conditional.make_etag(collection.name, seq, request.url.query)
+        if conditional.is_not_modified(request, etag, changed_at):
+            return conditional.not_modified_response(etag, changed_at)
+    try:
+        sort_spec = parse_sort(sort, sort_fields)
+        if cursor is None:
+            find = collection.find(query, projection)
+            if sort:
+                find = find.sort(sort_spec)
+            docs = await find.skip(skip).limit(limit).to_list(limit)
+            response = documents_response(docs)
+        else:
+            docs, next_cursor = await fetch_page(collection, query, sort_spec, limit, cursor, projection)
+            response = page_response(docs, next_cursor)
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request is not None:
+        response.headers.update(conditional.validator_headers(etag, changed_at))
+    return response
+
+# Fields each endpoint accepts in ``fields``, and the named presets
+PROPERTY_FIELDS = ("version", "location", *PropertyBase.model_fields)
+CUSTOMER_FIELDS = ("version", *CustomerBase.model_fields)
+SALE_FIELDS = ("version", *SaleBase.model_fields)
+LEASE_FIELDS = ("version", *LeaseBase.model_fields)
+FINANCE_FIELDS = ("version", *FinanceRecordBase.model_fields)
+PROPERTY_PRESETS = {
+    "summary": {"title": 1, "property_type": 1, "status": 1, "price": 1, "city": 1, "state": 1},
+    "card": {"title": 1, "property_type": 1, "status": 1, "price": 1, "area": 1, "bedrooms": 1, "bathrooms": 1,
+             "city": 1, "state": 1, "images": {"$slice": 1}},
+}
+CUSTOMER_PRESETS = {
+    "summary": {"first_name": 1, "last_name": 1, "email": 1, "phone": 1},
+    "card": {"first_name": 1, "last_name": 1, "email": 1, "phone": 1, "city": 1, "preferred_property_type": 1,
+             "budget_min": 1, "budget_max": 1, "assigned_agent_id": 1},
+}
+SALE_PRESETS = {
+    "summary": {"property_id": 1, "customer_id": 1, "agent_id": 1, "sale_price": 1, "closing_date": 1, "status": 1},
+}
+LEASE_PRESETS = {
+    "summary": {"property_id": 1, "tenant_id": 1, "monthly_rent": 1, "lease_start": 1, "lease_end": 1, "status": 1},
+}
+FINANCE_PRESETS = {
+    "summary": {"type": 1, "category": 1, "amount": 1, "date": 1, "description": 1},
+}
+
+def field_projection(fields, allowed, presets):
+    try:
+        return parse_fields(fields, allowed, presets)
+    except InvalidProjection as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def export_response(collection, query, export_format, columns, filename):
+    """Stream every matching document as NDJSON or CSV"""
+    cursor = collection.find(query, batch_size=EXPORT_BATCH_SIZE)
+    if export_format == ExportFormat.CSV:
+        body, media_type = stream_csv(cursor, columns), "text/csv"
+    else:
+        body, media_type = stream_ndjson(cursor), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'}
+    )
+
+def build_property_query(property_type=None, status=None, min_price=None, max_price=None, city=None, exact_city=False):
+    query = {}
+    if property_type:
+        query["property_type"] = property_type.value
+    if status:
+        query["status"] = status.value
+    if min_price or max_price:
+        query["price"] = {}
+        if min_price:
+            query["price"]["$gte"] = min_price
+        if max_price:
+            query["price"]["$lte"] = max_price
+    if city:
+        # Prefix (or exact) match on the normalized city so the index is used
+        query.update(city_filter(city, exact=exact_city))
+    return query
+
+def build_finance_query(type=None, category=None):
+    query = {}
+    if type:
+        query["type"] = type
+    if category:
+        query["category"] = category
+    return query
+
+# Fields each bulk endpoint accepts as ``upsert_key``
+PROPERTY_UPSERT_KEYS = ("external_id",)
+CUSTOMER_UPSERT_KEYS = ("external_id", "email")
+SALE_UPSERT_KEYS = ("external_id",)
+LEASE_UPSERT_KEYS = ("external_id",)
+FINANCE_UPSERT_KEYS = ("external_id",)
+
+async def bulk_create(request, model, collection, ordered, upsert_key, upsert_keys, prepare=to_mongo_doc):
+    """
+    Validate a JSON array or NDJSON body against ``model`` and write it
+    in one batch. Returns the response summary and the (before, after)
+    pairs of the successful writes.
+    """
+    if upsert_key and upsert_key not in upsert_keys:
+        raise HTTPException(status_code=400, detail=f"Cannot upsert on '{upsert_key}'")
+    try:
+        raw_items = parse_items(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body: {e}")
+    if len(raw_items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} records per request")
+
+    results, valid = [], []
+    for index, raw in enumerate(raw_items):
+        try:
+            valid.append((index, prepare(model.model_validate(raw).dict())))
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "errors": json.loads(e.json(include_url=False))})
+    if ordered and results:
+        # Ordered batches stop at the first bad record
+        first_invalid = results[0]["index"]
+        results += [{"index": index, "status": "skipped"} for index, _ in valid if index > first_invalid]
+        valid = [(index, doc) for index, doc in valid if index < first_invalid]
+
+    written, changes = await bulk_write_documents(collection, valid, upsert_key, ordered)
+    if changes:
+        await conditional.touch(db, collection.name)
+    results = sorted(results + written, key=lambda result: result["index"])
+    summary = {"total": len(raw_items), "results": results}
+    for outcome in ("created", "updated", "invalid", "failed", "skipped"):
+        summary[outcome] = sum(1 for result in results if result["status"] == outcome)
+    return summary, changes
+
+def prepare_property_doc(doc):
+    doc = to_mongo_doc(doc)
+    doc["city_normalized"] = normalize_city(doc.get("city"))
+    doc["location"] = location_from(doc)
+    return doc
+
+def prepare_property_patch(fields):
+    fields = to_mongo_doc(fields)
+    if "city" in fields:
+        fields["city_normalized"] = normalize_city(fields["city"])
+    if ("latitude" in fields) != ("longitude" in fields):
+        # The point is derived from both; one alone would need a second, racy write
+        raise HTTPException(status_code=400, detail="latitude and longitude must be updated together")
+    if "latitude" in fields:
+        fields["location"] = location_from(fields)
+    return fields
+
+def version_filter(expected_version):
+    # New documents start at 0; ones written before versioning have no field, which counts as 0 too
+    return {"version": expected_version if expected_version else {"$in": [0, None]}}
+
+async def patch_document(collection, document_id, fields, expected_version=None):
+    """
+    ``$set`` only ``fields`` and bump ``version`` in one round trip.
+    Returns the (before, after) pair; ``after`` is merged locally from the
+    pre-image, so derived data sees both states without a second read.
+    With ``expected_version`` a stale write is rejected with 409.
+    """
+    try:
+        query = {"_id": ObjectId(document_id)}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID")
+    if expected_version is not None:
+        query.update(version_filter(expected_version))
+    fields["updated_at"] = datetime.utcnow()
+    try:
+        before = await collection.find_one_and_update(query, {"$set": fields, "$inc": {"version": 1}})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Another record already has that value")
+    if before is None:
+        # Only failed writes pay for telling "missing" from "stale"
+        if expected_version is not None and await collection.count_documents({"_id": query["_id"]}, limit=1):
+            raise HTTPException(status_code=409, detail="Version conflict: the record was modified")
+        raise HTTPException(status_code=404, detail="Record not found")
+    await conditional.touch(db, collection.name)
+    return before, {**before, **fields, "version": before.get("version", 0) + 1}
+
+# Authentication dependency
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    # In production, validate JWT token here
-    return {"user_id": "demo_user", "role": "admin"}
+    try:
+        payload = decode_token(credentials.credentials, SECRET_KEY, ALGORITHM, token_cache)
+    except InvalidToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {"user_id": payload["sub"], "role": payload.get("role", "admin")}
 
 # Authentication Endpoints
 @app.post("/api/auth/login", response_model=Dict)
 async def login(response: Response, user_credentials: UserLogin):
-    # Mock authentication - in production, verify against database
-    if user_credentials.username == "admin" and user_credentials.password == "admin123":
+    # Single demo account - in production, look the user up in the database
+    if user_credentials.username == ADMIN_USERNAME and await verify_password(
+        user_credentials.password, await admin_password_hash()
+    ):
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
         
         access_token = create_access_token(
-            data={"sub": user_credentials.username}, 
+            data={"sub": user_credentials.username, "role": "admin", "type": "access"},
             expires_delta=access_token_expires
         )
         refresh_token = create_access_token(
-            data={"sub": user_credentials.username}, 
+            data={"sub": user_credentials.username, "role": "admin", "type": "refresh"},
             expires_delta=refresh_token_expires
         )
         
@@ -331,230 +707,725 @@ async def logout(response: Response):
     response.delete_cookie("refresh_token")
     return {"message": "Logout successful"}
 
+# Database lifecycle and background jobs
+def mongo_client_options():
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "event_listeners": [metrics.MongoCommandListener(SLOW_QUERY_MS)],
+    }
+    if MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if MONGODB_COMPRESSORS:
+        options["compressors"] = MONGODB_COMPRESSORS
+    return options
+
+async def open_database():
+    """Create this worker's client and open pooled connections before traffic arrives"""
+    global client, db, property_cache, customer_cache
+    client = AsyncIOMotorClient(MONGODB_URL, **mongo_client_options())
+    db = client[MONGODB_DATABASE]
+    property_cache = DocumentCache(db.properties, DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL_SECONDS, document_cache_backend)
+    customer_cache = DocumentCache(db.customers, DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL_SECONDS, document_cache_backend)
+    try:
+        # Concurrent pings each check out a connection, so this opens minPoolSize of them
+        await asyncio.gather(*(db.command("ping") for _ in range(max(MONGODB_MIN_POOL_SIZE, 1))))
+    except PyMongoError as e:
+        logger.warning("MongoDB not reachable at startup, connecting lazily: %s", e)
+
+async def provision_database():
+    # Every worker starts this; the first to claim the lease does the work and the rest skip it
+    async with background.single_runner(db, "provision_database") as claimed:
+        if claimed:
+            await ensure_indexes(db)
+            await backfill_city_normalized(db.properties)
+            await backfill_locations(db.properties)
+
+def start_background_jobs():
+    # Jobs given ``db`` run on one worker at a time; in-process snapshots refresh on every worker
+    jobs = [
+        run_periodically(partial(dashboard_counters.rebuild_counters, db), DASHBOARD_RECONCILE_SECONDS,
+                         "dashboard_counters.reconcile", db),
+        run_periodically(partial(finance_rollups.rebuild_rollups, db), FINANCE_ROLLUP_REBUILD_SECONDS,
+                         "finance_rollups.rebuild", db),
+        run_periodically(partial(agent_metrics.rebuild_metrics, db), AGENT_METRICS_REBUILD_SECONDS,
+                         "agent_metrics.rebuild", db),
+        run_periodically(partial(lease_scheduler.run_once, db, LEASE_RENEWAL_NOTICE_DAYS, LEASE_SCHEDULER_BATCH_SIZE),
+                         LEASE_SCHEDULER_SECONDS, "lease_scheduler", db),
+        run_periodically(partial(property_matcher.rebuild, db.properties), MATCHING_REFRESH_SECONDS,
+                         "matching.snapshot"),
+        feed_forever(db, event_hub, EVENT_COLLECTIONS, EVENTS_POLL_SECONDS, EVENTS_SOURCE),
+    ]
+    if ENSURE_INDEXES_ON_STARTUP:
+        # In the background: a first build on a large collection must not hold up startup
+        jobs.append(provision_database())
+    if SEARCH_BACKEND == "memory":
+        jobs.append(run_periodically(partial(property_search_index.rebuild, db.properties), SEARCH_INDEX_REFRESH_SECONDS,
+                                     "property_search.index"))
+    app.state.background_tasks = [asyncio.create_task(job) for job in jobs]
+    app.state.matching_job = None
+
+async def stop_background_jobs():
+    tasks = [*app.state.background_tasks, *filter(None, [app.state.matching_job])]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def after_property_writes(changes):
+    """Keep derived property data in step with a batch of (before, after) writes"""
+    await dashboard_counters.record_property_changes(db, changes)
+    await property_cache.apply_changes(changes)
+    property_matcher.apply_changes(changes)
+    if SEARCH_BACKEND == "memory":
+        property_search_index.apply_changes(changes)
+
 # API Routes
 
 # Dashboard Analytics
+async def load_dashboard_stats():
+    property_types = [prop_type.value for prop_type in PropertyType]
+    stats = await dashboard_counters.read_dashboard_counters(db, property_types)
+    if stats is None:
+        # Counters not reconciled yet, aggregate the raw collections instead
+        stats = await compute_dashboard_stats(db, property_types)
+    stats["recent_transactions"] = serialize_doc(stats["recent_transactions"])
+    return DashboardStats(**stats).model_dump()
+
 @app.get("/api/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
     try:
-        # Get basic counts
-        total_properties = await db.properties.count_documents({})
-        available_properties = await db.properties.count_documents({"status": "available"})
-        sold_properties = await db.properties.count_documents({"status": "sold"})
-        leased_properties = await db.properties.count_documents({"status": "leased"})
-        total_customers = await db.customers.count_documents({})
-        
-        # Calculate financial metrics
-        current_month = datetime.utcnow().replace(day=1)
-        monthly_revenue = await db.finance_records.aggregate([
-            {"$match": {"type": "income", "date": {"$gte": current_month}}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        
-        monthly_expenses = await db.finance_records.aggregate([
-            {"$match": {"type": "expense", "date": {"$gte": current_month}}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        
-        revenue = monthly_revenue[0]["total"] if monthly_revenue else 0
-        expenses = monthly_expenses[0]["total"] if monthly_expenses else 0
-        
-        # Properties by type
-        properties_by_type = {}
-        for prop_type in PropertyType:
-            count = await db.properties.count_documents({"property_type": prop_type.value})
-            properties_by_type[prop_type.value] = count
-        
-        # Average property price
-        avg_price_result = await db.properties.aggregate([
-            {"$group": {"_id": None, "avg_price": {"$avg": "$price"}}}
-        ]).to_list(1)
-        avg_price = avg_price_result[0]["avg_price"] if avg_price_result else 0
-        
-        # Total sales volume
-        sales_volume_result = await db.sales.aggregate([
-            {"$group": {"_id": None, "total": {"$sum": "$sale_price"}}}
-        ]).to_list(1)
-        sales_volume = sales_volume_result[0]["total"] if sales_volume_result else 0
-        
-        return DashboardStats(
-            total_properties=total_properties,
-            available_properties=available_properties,
-            sold_properties=sold_properties,
-            leased_properties=leased_properties,
-            total_customers=total_customers,
-            active_leads=total_customers,  # Simplified
-            monthly_revenue=revenue,
-            monthly_expenses=expenses,
-            net_profit=revenue - expenses,
-            total_sales_volume=sales_volume,
-            average_property_price=avg_price,
-            properties_by_type=properties_by_type,
-            sales_by_month=[],  # Would implement with aggregation
-            top_agents=[],  # Would implement with aggregation
-            recent_transactions=[]  # Would implement with recent sales/leases
-        )
+        return JSONBytesResponse(await dashboard_cache.get("stats", load_dashboard_stats))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Properties API
-@app.get("/api/properties", response_model=List[Dict])
+@app.get("/api/properties", response_model=Union[List[Dict], CursorPage])
 async def get_properties(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
     property_type: Optional[PropertyType] = None,
     status: Optional[PropertyStatus] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    city: Optional[str] = None
+    city: Optional[str] = None,
+    exact_city: bool = False,
+    fields: Optional[str] = None
 ):
-    """Get properties with filtering"""
-    query = {}
-    if property_type:
-        query["property_type"] = property_type.value
-    if status:
-        query["status"] = status.value
-    if min_price or max_price:
-        query["price"] = {}
-        if min_price:
-            query["price"]["$gte"] = min_price
-        if max_price:
-            query["price"]["$lte"] = max_price
-    if city:
-        query["city"] = {"$regex": city, "$options": "i"}
-    
-    properties = await db.properties.find(query).skip(skip).limit(limit).to_list(limit)
-    return [serialize_doc(prop) for prop in properties]
+    """Get properties with filtering; ``fields`` takes field names and/or summary, card"""
+    query = build_property_query(property_type, status, min_price, max_price, city, exact_city)
+    projection = field_projection(fields, PROPERTY_FIELDS, PROPERTY_PRESETS)
+    return await list_documents(db.properties, query, skip, limit, sort, cursor, PROPERTY_SORT_FIELDS, projection, request)
+
+@app.get("/api/properties/export")
+async def export_properties(
+    format: ExportFormat = ExportFormat.NDJSON,
+    property_type: Optional[PropertyType] = None,
+    status: Optional[PropertyStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    city: Optional[str] = None,
+    exact_city: bool = False
+):
+    """Stream all matching properties"""
+    query = build_property_query(property_type, status, min_price, max_price, city, exact_city)
+    return export_response(db.properties, query, format, ["id", *PropertyBase.model_fields], "properties")
+
+async def geo_page(near, query, limit, cursor, max_distance=None):
+    try:
+        docs, next_cursor = await nearest_page(db.properties, near, query, limit, cursor, max_distance)
+    except (InvalidPageRequest, InvalidShape) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return page_response(docs, next_cursor)
+
+@app.get("/api/properties/near", response_model=CursorPage)
+async def get_properties_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, gt=0),
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    property_type: Optional[PropertyType] = None,
+    status: Optional[PropertyStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """Properties nearest to a point, optionally within a radius in meters"""
+    query = build_property_query(property_type, status, min_price, max_price)
+    return await geo_page(point(lat, lng), query, limit, cursor, radius_m)
+
+@app.get("/api/properties/within", response_model=CursorPage)
+async def get_properties_within(
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lng: Optional[float] = Query(None, ge=-180, le=180),
+    polygon: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    property_type: Optional[PropertyType] = None,
+    status: Optional[PropertyStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """
+    Properties inside a bounding box (min/max lat/lng) or a polygon given
+    as ``lng,lat;lng,lat;...``, nearest to the shape's center first.
+    """
+    try:
+        if polygon:
+            shape = parse_polygon(polygon)
+        elif None not in (min_lat, min_lng, max_lat, max_lng):
+            shape = bbox_polygon(min_lat, min_lng, max_lat, max_lng)
+        else:
+            raise ValueError("Pass either a polygon or all four bounding box coordinates")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = build_property_query(property_type, status, min_price, max_price)
+    query.update(within_filter(shape))
+    return await geo_page(polygon_center(shape), query, limit, cursor)
+
+@app.get("/api/properties/search", response_model=List[Dict])
+async def search_properties(
+    q: str = Query(..., min_length=1),
+    skip: int = 0,
+    limit: int = 20,
+    property_type: Optional[PropertyType] = None,
+    status: Optional[PropertyStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    city: Optional[str] = None,
+    exact_city: bool = False
+):
+    """Full-text search over title, description, address and amenities, best matches first"""
+    query = build_property_query(property_type, status, min_price, max_price, city, exact_city)
+    if SEARCH_BACKEND == "memory":
+        docs = await memory_search(property_search_index, db.properties, q, query, skip, limit)
+    else:
+        docs = await mongo_text_search(db.properties, q, query, skip, limit)
+    return documents_response(docs)
+
+@app.get("/api/properties/cities", response_model=List[Dict])
+async def get_city_suggestions(prefix: str, limit: int = 10):
+    """Typeahead: cities starting with ``prefix``, ignoring case and accents"""
+    return await suggest_cities(db.properties, prefix, limit)
 
 @app.post("/api/properties", response_model=Dict)
 async def create_property(property_data: PropertyBase, user=Depends(get_current_user)):
     """Create a new property"""
-    property_dict = property_data.dict()
-    result = await db.properties.insert_one(property_dict)
-    created_property = await db.properties.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_property)
+    property_dict = prepare_property_doc(property_data.dict())
+    property_dict["version"] = 0
+    await db.properties.insert_one(property_dict)
+    await conditional.touch(db, "properties")
+    await after_property_writes([(None, property_dict)])
+    return document_response(property_dict)
+
+@app.post("/api/properties/bulk", response_model=Dict)
+async def bulk_create_properties(
+    request: Request,
+    ordered: bool = False,
+    upsert_key: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Create or upsert many properties from a JSON array or NDJSON body"""
+    summary, changes = await bulk_create(
+        request, PropertyBase, db.properties, ordered, upsert_key, PROPERTY_UPSERT_KEYS, prepare=prepare_property_doc
+    )
+    await after_property_writes(changes)
+    return summary
 
 @app.get("/api/properties/{property_id}", response_model=Dict)
-async def get_property(property_id: str):
-    """Get a specific property"""
+async def get_property(request: Request, property_id: str, fields: Optional[str] = None):
+    """Get a specific property; honors If-None-Match / If-Modified-Since"""
+    projection = field_projection(fields, PROPERTY_FIELDS, PROPERTY_PRESETS)
     try:
-        property_doc = await db.properties.find_one({"_id": ObjectId(property_id)})
-        if not property_doc:
-            raise HTTPException(status_code=404, detail="Property not found")
-        return serialize_doc(property_doc)
-    except Exception as e:
+        property_oid = ObjectId(property_id)
+    except Exception:
         raise HTTPException(status_code=400, detail="Invalid property ID")
+    property_doc = await property_cache.get(property_oid)
+    if not property_doc:
+        raise HTTPException(status_code=404, detail="Property not found")
+    etag, last_modified = conditional.document_validators(property_doc, fields or "")
+    if conditional.is_not_modified(request, etag, last_modified):
+        return conditional.not_modified_response(etag, last_modified)
+    response = document_response(project(property_doc, projection))
+    response.headers.update(conditional.validator_headers(etag, last_modified))
+    return response
 
 @app.put("/api/properties/{property_id}", response_model=Dict)
 async def update_property(property_id: str, property_data: PropertyBase, user=Depends(get_current_user)):
     """Update a property"""
     try:
-        property_dict = property_data.dict()
+        property_dict = prepare_property_doc(property_data.dict())
         property_dict["updated_at"] = datetime.utcnow()
-        result = await db.properties.update_one(
+        previous = await db.properties.find_one_and_update(
             {"_id": ObjectId(property_id)},
-            {"$set": property_dict}
+            {"$set": property_dict, "$inc": {"version": 1}}
         )
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Property not found")
-        updated_property = await db.properties.find_one({"_id": ObjectId(property_id)})
-        return serialize_doc(updated_property)
+        property_dict["version"] = previous.get("version", 0) + 1
+        await conditional.touch(db, "properties")
+        await after_property_writes([(previous, property_dict)])
+        return document_response({**previous, **property_dict})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.patch("/api/properties/{property_id}", response_model=Dict)
+async def patch_property(
+    property_id: str,
+    property_data: PropertyPatch,
+    expected_version: Optional[int] = None,
+    user=Depends(get_current_user)
+):
+    """Update only the fields sent; pass ``expected_version`` to reject stale writes"""
+    fields = prepare_property_patch(property_data.model_dump(exclude_unset=True))
+    before, after = await patch_document(db.properties, property_id, fields, expected_version)
+    await after_property_writes([(before, after)])
+    return document_response(after)
+
 @app.delete("/api/properties/{property_id}")
 async def delete_property(property_id: str, user=Depends(get_current_user)):
     """Delete a property"""
     try:
-        result = await db.properties.delete_one({"_id": ObjectId(property_id)})
-        if result.deleted_count == 0:
+        deleted = await db.properties.find_one_and_delete({"_id": ObjectId(property_id)})
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Property not found")
+        await conditional.touch(db, "properties")
+        await after_property_writes([(deleted, None)])
         return {"message": "Property deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Customers API
-@app.get("/api/customers", response_model=List[Dict])
-async def get_customers(skip: int = 0, limit: int = 100):
+@app.get("/api/customers", response_model=Union[List[Dict], CursorPage])
+async def get_customers(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """Get customers"""
-    customers = await db.customers.find().skip(skip).limit(limit).to_list(limit)
-    return [serialize_doc(customer) for customer in customers]
+    projection = field_projection(fields, CUSTOMER_FIELDS, CUSTOMER_PRESETS)
+    return await list_documents(db.customers, {}, skip, limit, sort, cursor, CUSTOMER_SORT_FIELDS, projection, request)
+
+@app.get("/api/customers/export")
+async def export_customers(format: ExportFormat = ExportFormat.NDJSON):
+    """Stream all customers"""
+    return export_response(db.customers, {}, format, ["id", *CustomerBase.model_fields], "customers")
 
 @app.post("/api/customers", response_model=Dict)
 async def create_customer(customer_data: CustomerBase, user=Depends(get_current_user)):
     """Create a new customer"""
-    customer_dict = customer_data.dict()
-    result = await db.customers.insert_one(customer_dict)
-    created_customer = await db.customers.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_customer)
+    customer_dict = to_mongo_doc(customer_data.dict())
+    customer_dict["version"] = 0
+    try:
+        await db.customers.insert_one(customer_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A customer with this email already exists")
+    await conditional.touch(db, "customers")
+    await customer_cache.put(customer_dict)
+    return document_response(customer_dict)
+
+@app.post("/api/customers/bulk", response_model=Dict)
+async def bulk_create_customers(
+    request: Request,
+    ordered: bool = False,
+    upsert_key: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Create or upsert many customers from a JSON array or NDJSON body"""
+    summary, changes = await bulk_create(request, CustomerBase, db.customers, ordered, upsert_key, CUSTOMER_UPSERT_KEYS)
+    await customer_cache.apply_changes(changes)
+    return summary
+
+@app.patch("/api/customers/{customer_id}", response_model=Dict)
+async def patch_customer(
+    customer_id: str,
+    customer_data: CustomerPatch,
+    expected_version: Optional[int] = None,
+    user=Depends(get_current_user)
+):
+    """Update only the fields sent; pass ``expected_version`` to reject stale writes"""
+    fields = to_mongo_doc(customer_data.model_dump(exclude_unset=True))
+    before, after = await patch_document(db.customers, customer_id, fields, expected_version)
+    await customer_cache.apply_changes([(before, after)])
+    return document_response(after)
+
+@app.post("/api/customers/matches/refresh", status_code=202, response_model=Dict)
+async def refresh_customer_matches(limit: int = Query(matching.DEFAULT_LIMIT, ge=1, le=100), user=Depends(get_current_user)):
+    """Start ranking matches for every customer with a budget into ``customer_matches``"""
+    if not property_matcher.loaded:
+        raise HTTPException(status_code=503, detail="Property matching snapshot is still loading")
+    # A database lease, so runs started on different workers do not overlap
+    lease = await background.claim(db, matching.RUN_LEASE)
+    if lease is None:
+        raise HTTPException(status_code=409, detail="A matching run is already in progress")
+    app.state.matching_job = asyncio.create_task(run_customer_matching(lease, limit))
+    return {"status": "started"}
+
+async def run_customer_matching(lease, limit):
+    try:
+        report = await matching.match_all_customers(db, property_matcher, limit)
+        logger.info("Customer matching: %s", report)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Customer matching run failed")
+    finally:
+        await lease.release()
+
+@app.get("/api/customers/{customer_id}/matches")
+async def get_customer_matches(
+    customer_id: str,
+    limit: int = Query(matching.DEFAULT_LIMIT, ge=1, le=100),
+    fields: Optional[str] = "card"
+):
+    """
+    Available properties ranked for the customer's budget, preferred type
+    and city: the last batch run's ranking while it is current, else live
+    """
+    projection = field_projection(fields, PROPERTY_FIELDS, PROPERTY_PRESETS)
+    try:
+        customer_oid = ObjectId(customer_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid customer ID")
+    customer_doc = await customer_cache.get(customer_oid)
+    if not customer_doc:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    ranked = await matching.stored_matches(db, customer_doc, limit)
+    if ranked is None:
+        if not property_matcher.loaded:
+            raise HTTPException(status_code=503, detail="Property matching snapshot is still loading")
+        ranked = property_matcher.match(customer_doc, limit)
+    if not ranked:
+        return documents_response([])
+    # Stored rankings can name listings that have since been taken off the market
+    query = {"_id": {"$in": [doc_id for doc_id, _ in ranked]}, "status": matching.AVAILABLE}
+    docs = await db.properties.find(query, projection).to_list(len(ranked))
+    by_id = {doc["_id"]: doc for doc in docs}
+    return documents_response([{**by_id[doc_id], "score": score} for doc_id, score in ranked if doc_id in by_id])
 
 @app.get("/api/customers/{customer_id}", response_model=Dict)
-async def get_customer(customer_id: str):
-    """Get a specific customer"""
+async def get_customer(request: Request, customer_id: str, fields: Optional[str] = None):
+    """Get a specific customer; honors If-None-Match / If-Modified-Since"""
+    projection = field_projection(fields, CUSTOMER_FIELDS, CUSTOMER_PRESETS)
     try:
-        customer_doc = await db.customers.find_one({"_id": ObjectId(customer_id)})
-        if not customer_doc:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        return serialize_doc(customer_doc)
-    except Exception as e:
+        customer_oid = ObjectId(customer_id)
+    except Exception:
         raise HTTPException(status_code=400, detail="Invalid customer ID")
+    customer_doc = await customer_cache.get(customer_oid)
+    if not customer_doc:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    etag, last_modified = conditional.document_validators(customer_doc, fields or "")
+    if conditional.is_not_modified(request, etag, last_modified):
+        return conditional.not_modified_response(etag, last_modified)
+    response = document_response(project(customer_doc, projection))
+    response.headers.update(conditional.validator_headers(etag, last_modified))
+    return response
 
 # Sales API
-@app.get("/api/sales", response_model=List[Dict])
-async def get_sales(skip: int = 0, limit: int = 100):
+@app.get("/api/sales", response_model=Union[List[Dict], CursorPage])
+async def get_sales(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """Get sales records"""
-    sales = await db.sales.find().skip(skip).limit(limit).to_list(limit)
-    return [serialize_doc(sale) for sale in sales]
+    projection = field_projection(fields, SALE_FIELDS, SALE_PRESETS)
+    return await list_documents(db.sales, {}, skip, limit, sort, cursor, SALE_SORT_FIELDS, projection, request)
+
+@app.get("/api/sales/export")
+async def export_sales(format: ExportFormat = ExportFormat.NDJSON):
+    """Stream all sales records"""
+    return export_response(db.sales, {}, format, ["id", *SaleBase.model_fields], "sales")
 
 @app.post("/api/sales", response_model=Dict)
 async def create_sale(sale_data: SaleBase, user=Depends(get_current_user)):
     """Create a new sale"""
-    sale_dict = sale_data.dict()
-    result = await db.sales.insert_one(sale_dict)
-    created_sale = await db.sales.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_sale)
+    sale_dict = to_mongo_doc(sale_data.dict())
+    sale_dict["version"] = 0
+    await db.sales.insert_one(sale_dict)
+    await conditional.touch(db, "sales")
+    await dashboard_counters.record_sale_created(db, sale_dict)
+    await agent_metrics.record_sale_created(db, sale_dict)
+    return document_response(sale_dict)
+
+@app.post("/api/sales/bulk", response_model=Dict)
+async def bulk_create_sales(
+    request: Request,
+    ordered: bool = False,
+    upsert_key: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Create or upsert many sales from a JSON array or NDJSON body"""
+    summary, changes = await bulk_create(request, SaleBase, db.sales, ordered, upsert_key, SALE_UPSERT_KEYS)
+    await dashboard_counters.record_sale_changes(db, changes)
+    await agent_metrics.record_sale_changes(db, changes)
+    return summary
+
+@app.patch("/api/sales/{sale_id}", response_model=Dict)
+async def patch_sale(
+    sale_id: str,
+    sale_data: SalePatch,
+    expected_version: Optional[int] = None,
+    user=Depends(get_current_user)
+):
+    """Update only the fields sent; pass ``expected_version`` to reject stale writes"""
+    fields = to_mongo_doc(sale_data.model_dump(exclude_unset=True))
+    before, after = await patch_document(db.sales, sale_id, fields, expected_version)
+    await dashboard_counters.record_sale_changes(db, [(before, after)])
+    await agent_metrics.record_sale_changes(db, [(before, after)])
+    return document_response(after)
+
+# Agents API
+@app.get("/api/agents/leaderboard", response_model=Dict)
+async def agent_leaderboard(
+    period: str = Query("all", description="all, this_month, last_month, this_year, last_year, YYYY or YYYY-MM"),
+    metric: str = Query("sales_volume", description=", ".join(agent_metrics.RANKED_METRICS)),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Top agents for a period, read in order from the precomputed per-agent metrics"""
+    try:
+        return await agent_metrics.leaderboard(db, period, metric, limit)
+    except agent_metrics.InvalidLeaderboard as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Leases API
-@app.get("/api/leases", response_model=List[Dict])
-async def get_leases(skip: int = 0, limit: int = 100):
+@app.get("/api/leases", response_model=Union[List[Dict], CursorPage])
+async def get_leases(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """Get lease records"""
-    leases = await db.leases.find().skip(skip).limit(limit).to_list(limit)
-    return [serialize_doc(lease) for lease in leases]
+    projection = field_projection(fields, LEASE_FIELDS, LEASE_PRESETS)
+    return await list_documents(db.leases, {}, skip, limit, sort, cursor, LEASE_SORT_FIELDS, projection, request)
+
+@app.get("/api/leases/expiring", response_model=Union[List[Dict], CursorPage])
+async def get_expiring_leases(
+    within: int = Query(30, ge=0, le=366, description="Days from today"),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Active leases ending within ``within`` days, soonest first"""
+    projection = field_projection(fields, LEASE_FIELDS, LEASE_PRESETS)
+    start = lease_scheduler.today()
+    query = lease_scheduler.expiring_query(start, start + timedelta(days=within))
+    # No change-marker validators: the window moves with the date, not with writes
+    return await list_documents(db.leases, query, skip, limit, "lease_end", cursor, LEASE_SORT_FIELDS, projection)
+
+@app.get("/api/leases/renewals", response_model=Union[List[Dict], CursorPage])
+async def get_lease_renewals(
+    request: Request,
+    state: str = "pending",
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = "lease_end"
+):
+    """The renewal queue kept by the lease scheduler; ``id`` is the lease's id"""
+    if state not in lease_scheduler.RENEWAL_STATES:
+        raise HTTPException(status_code=400, detail=f"state must be one of {', '.join(lease_scheduler.RENEWAL_STATES)}")
+    return await list_documents(db[lease_scheduler.RENEWALS], {"state": state}, skip, limit, sort, cursor,
+                                RENEWAL_SORT_FIELDS, request=request)
+
+@app.get("/api/leases/export")
+async def export_leases(format: ExportFormat = ExportFormat.NDJSON):
+    """Stream all lease records"""
+    return export_response(db.leases, {}, format, ["id", *LeaseBase.model_fields], "leases")
 
 @app.post("/api/leases", response_model=Dict)
 async def create_lease(lease_data: LeaseBase, user=Depends(get_current_user)):
     """Create a new lease"""
-    lease_dict = lease_data.dict()
-    result = await db.leases.insert_one(lease_dict)
-    created_lease = await db.leases.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_lease)
+    lease_dict = to_mongo_doc(lease_data.dict())
+    lease_dict["version"] = 0
+    await db.leases.insert_one(lease_dict)
+    await conditional.touch(db, "leases")
+    await agent_metrics.record_lease_created(db, lease_dict)
+    return document_response(lease_dict)
+
+@app.post("/api/leases/bulk", response_model=Dict)
+async def bulk_create_leases(
+    request: Request,
+    ordered: bool = False,
+    upsert_key: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Create or upsert many leases from a JSON array or NDJSON body"""
+    summary, changes = await bulk_create(request, LeaseBase, db.leases, ordered, upsert_key, LEASE_UPSERT_KEYS)
+    await agent_metrics.record_lease_changes(db, changes)
+    return summary
+
+@app.patch("/api/leases/{lease_id}", response_model=Dict)
+async def patch_lease(
+    lease_id: str,
+    lease_data: LeasePatch,
+    expected_version: Optional[int] = None,
+    user=Depends(get_current_user)
+):
+    """Update only the fields sent; pass ``expected_version`` to reject stale writes"""
+    fields = to_mongo_doc(lease_data.model_dump(exclude_unset=True))
+    before, after = await patch_document(db.leases, lease_id, fields, expected_version)
+    await agent_metrics.record_lease_changes(db, [(before, after)])
+    return document_response(after)
 
 # Finance API
-@app.get("/api/finance", response_model=List[Dict])
+@app.get("/api/finance", response_model=Union[List[Dict], CursorPage])
 async def get_finance_records(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
     type: Optional[str] = None,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     """Get finance records"""
-    query = {}
-    if type:
-        query["type"] = type
-    if category:
-        query["category"] = category
-    
-    records = await db.finance_records.find(query).skip(skip).limit(limit).to_list(limit)
-    return [serialize_doc(record) for record in records]
+    query = build_finance_query(type, category)
+    projection = field_projection(fields, FINANCE_FIELDS, FINANCE_PRESETS)
+    return await list_documents(db.finance_records, query, skip, limit, sort, cursor, FINANCE_SORT_FIELDS, projection, request)
+
+@app.get("/api/finance/export")
+async def export_finance_records(
+    format: ExportFormat = ExportFormat.NDJSON,
+    type: Optional[str] = None,
+    category: Optional[str] = None
+):
+    """Stream all matching finance records"""
+    query = build_finance_query(type, category)
+    return export_response(db.finance_records, query, format, ["id", *FinanceRecordBase.model_fields], "finance_records")
+
+@app.get("/api/finance/summary", response_model=Dict)
+async def finance_summary(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    group_by: str = Query("type", description="Comma-separated: type, category, property_id, agent_id"),
+    period: Optional[str] = Query(None, description="Also bucket by day, month or year"),
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    property_id: Optional[str] = None,
+    agent_id: Optional[str] = None
+):
+    """Income and expense totals over a date range, answered from the daily/monthly rollups"""
+    try:
+        return await finance_rollups.summarize(
+            db, date_from, date_to,
+            group_by=[dim.strip() for dim in group_by.split(",") if dim.strip()],
+            period=period,
+            filters={"type": type, "category": category, "property_id": property_id, "agent_id": agent_id},
+        )
+    except finance_rollups.InvalidSummary as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/finance", response_model=Dict)
 async def create_finance_record(record_data: FinanceRecordBase, user=Depends(get_current_user)):
     """Create a new finance record"""
-    record_dict = record_data.dict()
-    result = await db.finance_records.insert_one(record_dict)
-    created_record = await db.finance_records.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_record)
+    record_dict = to_mongo_doc(record_data.dict())
+    record_dict["version"] = 0
+    await db.finance_records.insert_one(record_dict)
+    await conditional.touch(db, "finance_records")
+    await dashboard_counters.record_finance_created(db, record_dict)
+    await finance_rollups.record_created(db, record_dict)
+    await agent_metrics.record_finance_created(db, record_dict)
+    return document_response(record_dict)
+
+@app.post("/api/finance/bulk", response_model=Dict)
+async def bulk_create_finance_records(
+    request: Request,
+    ordered: bool = False,
+    upsert_key: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Create or upsert many finance records from a JSON array or NDJSON body"""
+    summary, changes = await bulk_create(request, FinanceRecordBase, db.finance_records, ordered, upsert_key, FINANCE_UPSERT_KEYS)
+    await dashboard_counters.record_finance_changes(db, changes)
+    await finance_rollups.record_changes(db, changes)
+    await agent_metrics.record_finance_changes(db, changes)
+    return summary
+
+# Server-sent events
+@app.get("/api/events")
+async def stream_events():
+    """
+    Change notifications as server-sent events. Each ``change`` event lists
+    the collections written since the previous one, with operation counts;
+    clients refetch what they show instead of polling.
+    """
+    subscription = event_hub.subscribe()
+
+    async def events():
+        try:
+            yield format_event("ready", {"mode": event_hub.mode, "collections": EVENT_COLLECTIONS})
+            while True:
+                delta = await event_hub.next_delta(subscription, EVENTS_HEARTBEAT_SECONDS)
+                yield format_event("change", {"collections": delta}) if delta else b": keepalive\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Metrics
+cache_lookups = metrics.registry.register(metrics.Counter(
+    "document_cache_lookups_total", "Single-record cache lookups by outcome", ("cache", "result")))
+event_subscribers = metrics.registry.register(metrics.Gauge(
+    "event_stream_subscribers", "Open /api/events streams"))
+token_cache_lookups = metrics.registry.register(metrics.Counter(
+    "auth_token_cache_lookups_total", "Access-token validations by cache outcome", ("result",)))
+
+def collect_app_metrics():
+    for name, cache in (("properties", property_cache), ("customers", customer_cache)):
+        stats = cache.stats()
+        for result in ("hits", "shared_hits", "misses", "coalesced"):
+            yield cache_lookups, (name, result), stats[result]
+    yield event_subscribers, (), len(event_hub)
+    for result in ("hits", "misses"):
+        yield token_cache_lookups, (result,), token_cache.counters[result]
+
+metrics.registry.add_collector(collect_app_metrics)
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition for this worker"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Diagnostics
+@app.get("/api/diagnostics/indexes", response_model=Dict)
+async def index_diagnostics(user=Depends(get_current_user)):
+    """Explain each endpoint's canonical query and flag collection scans"""
+    plans = await check_query_plans(db)
+    return {
+        "collscans": sum(1 for plan in plans if plan["collscan"]),
+        "plans": plans
+    }
+
+@app.get("/api/diagnostics/cache", response_model=Dict)
+async def cache_diagnostics(user=Depends(get_current_user)):
+    """Hit/miss counters of the single-record caches, for sizing them"""
+    return {
+        "properties": property_cache.stats(),
+        "customers": customer_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "shared_backend": type(document_cache_backend).__name__ if document_cache_backend else None
+    }
 
 # Health check
 @app.get("/api/health")
@@ -563,4 +1434,5 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    # Development server; use serve.py in production
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
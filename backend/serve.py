@@ -0,0 +1,54 @@
+"""
+Production entry point: several uvicorn worker processes behind one port.
+
+Each worker imports the app, opens its own MongoDB pool in the lifespan
+handler and runs its own background jobs. Size the pool with that in
+mind: workers x MONGODB_MAX_POOL_SIZE connections can be open at once.
+
+    cd backend
+    python serve.py --workers 4
+
+Workers default to WEB_CONCURRENCY, else the number of CPUs. uvloop and
+httptools are used when installed (uvicorn[standard] pulls them in).
+
+SECRET_KEY must be set: every worker has to verify tokens the others
+signed, and tokens should survive a restart.
+"""
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+    if not os.getenv("SECRET_KEY"):
+        parser.error("SECRET_KEY is not set; workers would each sign tokens with their own random key")
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if installed("uvloop") else "asyncio",
+        http="httptools" if installed("httptools") else "h11",
+        log_level=args.log_level,
+        # Behind a load balancer: trust X-Forwarded-* from FORWARDED_ALLOW_IPS
+        proxy_headers=True,
+        # Keep-alive a little longer than typical load balancer idle timeouts
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_SECONDS", "75")),
+    )
@@ -0,0 +1,250 @@
+"""
+Per-agent performance metrics.
+
+``agent_metrics`` holds one document per agent and period: the month
+("2024-05"), the year ("2024") and all time ("all"). Each one carries
+
+* ``sales_count``, ``sales_volume``, ``commission``: closed sales by
+  ``closing_date``;
+* ``stages``: sales in every deal stage, by ``closing_date``;
+* ``lease_count``, ``lease_rent``: leases by ``lease_start``, with the
+  monthly rent they signed;
+* ``commission_income``: finance income in the "commission" category
+  booked against the agent, by ``date``.
+
+Write handlers apply ``$inc`` deltas through the ``record_*`` functions
+and ``rebuild_metrics`` recomputes the collection from the source
+collections and swaps it in. Every ranked metric has a (period, metric)
+index, so a leaderboard is an index walk that stops after ``limit``
+documents. Rebuild from the command line after importing data directly:
+
+    cd backend
+    python -m services.agent_metrics
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from services.changes import Change, safe_key, signed
+from services.dashboard_stats import month_start, shift_months
+from services.rebuild import replace_collection
+
+METRICS = "agent_metrics"
+ALL_TIME = "all"
+CLOSED = "closed"
+RANKED_METRICS = ("sales_volume", "commission", "sales_count", "lease_count", "commission_income")
+METRIC_FIELDS = ("sales_count", "sales_volume", "commission", "lease_count", "lease_rent", "commission_income")
+
+Deltas = Dict[Tuple[str, str], Dict[str, float]]
+
+
+class InvalidLeaderboard(ValueError):
+    pass
+
+
+def _periods(value: Any) -> List[str]:
+    """Every period a document dated ``value`` counts towards; undated documents count nowhere"""
+    if isinstance(value, (datetime, date)):
+        return [ALL_TIME, f"{value.year:04d}", f"{value.year:04d}-{value.month:02d}"]
+    return []
+
+
+def _add(deltas: Deltas, agent_id: Any, when: Any, inc: Dict[str, float]) -> None:
+    if not agent_id:
+        return
+    for period in _periods(when):
+        entry = deltas.setdefault((agent_id, period), {})
+        for key, value in inc.items():
+            entry[key] = entry.get(key, 0) + value
+
+
+def _sale_inc(doc: Dict[str, Any], sign: int) -> Dict[str, float]:
+    stage = safe_key(doc.get("status"))
+    inc: Dict[str, float] = {}
+    if stage:
+        inc[f"stages.{stage}"] = sign
+    if stage == CLOSED:
+        inc["sales_count"] = sign
+        inc["sales_volume"] = sign * (doc.get("sale_price") or 0)
+        inc["commission"] = sign * (doc.get("commission_amount") or 0)
+    return inc
+
+
+def _lease_inc(doc: Dict[str, Any], sign: int) -> Dict[str, float]:
+    return {"lease_count": sign, "lease_rent": sign * (doc.get("monthly_rent") or 0)}
+
+
+def _is_commission_income(doc: Dict[str, Any]) -> bool:
+    return doc.get("type") == "income" and doc.get("category") == "commission"
+
+
+async def _apply(db, deltas: Deltas) -> None:
+    requests = []
+    for (agent_id, period), inc in deltas.items():
+        inc = {key: value for key, value in inc.items() if value}
+        if inc:
+            requests.append(UpdateOne(
+                {"_id": f"{agent_id}|{period}"},
+                {"$setOnInsert": {"agent_id": agent_id, "period": period}, "$inc": inc},
+                upsert=True,
+            ))
+    if requests:
+        await db[METRICS].bulk_write(requests, ordered=False)
+
+
+async def record_sale_changes(db, changes: Iterable[Change]) -> None:
+    """Apply a batch of sale writes"""
+    deltas: Deltas = {}
+    for doc, sign in signed(changes):
+        _add(deltas, doc.get("agent_id"), doc.get("closing_date"), _sale_inc(doc, sign))
+    await _apply(db, deltas)
+
+
+async def record_lease_changes(db, changes: Iterable[Change]) -> None:
+    deltas: Deltas = {}
+    for doc, sign in signed(changes):
+        _add(deltas, doc.get("agent_id"), doc.get("lease_start"), _lease_inc(doc, sign))
+    await _apply(db, deltas)
+
+
+async def record_finance_changes(db, changes: Iterable[Change]) -> None:
+    deltas: Deltas = {}
+    for doc, sign in signed(changes):
+        if _is_commission_income(doc):
+            _add(deltas, doc.get("agent_id"), doc.get("date"), {"commission_income": sign * (doc.get("amount") or 0)})
+    await _apply(db, deltas)
+
+
+async def record_sale_created(db, doc: Dict[str, Any]) -> None:
+    await record_sale_changes(db, [(None, doc)])
+
+
+async def record_lease_created(db, doc: Dict[str, Any]) -> None:
+    await record_lease_changes(db, [(None, doc)])
+
+
+async def record_finance_created(db, doc: Dict[str, Any]) -> None:
+    await record_finance_changes(db, [(None, doc)])
+
+
+def _monthly(collection, match: Dict[str, Any], date_field: str, group: Dict[str, Any], sums: Dict[str, Any]):
+    """(agent_id, month, *group) totals of the documents dated by ``date_field``"""
+    return collection.aggregate([
+        {"$match": {"agent_id": {"$nin": [None, ""]}, date_field: {"$type": "date"}, **match}},
+        {"$group": {
+            "_id": {"agent_id": "$agent_id", "month": {"$dateToString": {"format": "%Y-%m", "date": f"${date_field}"}},
+                    **group},
+            **sums,
+        }},
+    ], allowDiskUse=True)
+
+
+async def rebuild_metrics(db) -> int:
+    """
+    Recompute every document from sales, leases and finance records and
+    swap the result in. Increments that land during the rebuild are lost
+    until the next one. Returns the number of documents.
+    """
+    deltas: Deltas = {}
+
+    def add(group: Dict[str, Any], inc: Dict[str, float]) -> None:
+        _add(deltas, group["_id"]["agent_id"], datetime.strptime(group["_id"]["month"], "%Y-%m"), inc)
+
+    async for group in _monthly(db.sales, {}, "closing_date", {"status": "$status"}, {
+        "count": {"$sum": 1}, "volume": {"$sum": "$sale_price"}, "commission": {"$sum": "$commission_amount"},
+    }):
+        stage = safe_key(group["_id"].get("status"))
+        inc = {f"stages.{stage}": group["count"]} if stage else {}
+        if stage == CLOSED:
+            inc.update(sales_count=group["count"], sales_volume=group["volume"], commission=group["commission"])
+        add(group, inc)
+
+    async for group in _monthly(db.leases, {}, "lease_start", {}, {
+        "count": {"$sum": 1}, "rent": {"$sum": "$monthly_rent"},
+    }):
+        add(group, {"lease_count": group["count"], "lease_rent": group["rent"]})
+
+    async for group in _monthly(db.finance_records, {"type": "income", "category": "commission"}, "date", {}, {
+        "amount": {"$sum": "$amount"},
+    }):
+        add(group, {"commission_income": group["amount"]})
+
+    async def docs():
+        for (agent_id, period), inc in deltas.items():
+            doc: Dict[str, Any] = {"_id": f"{agent_id}|{period}", "agent_id": agent_id, "period": period}
+            for key, value in inc.items():
+                if key.startswith("stages."):
+                    doc.setdefault("stages", {})[key.split(".", 1)[1]] = value
+                else:
+                    doc[key] = value
+            yield doc
+
+    return await replace_collection(db, METRICS, docs())
+
+
+def resolve_period(period: str, now: Optional[datetime] = None) -> str:
+    """
+    The stored period for ``period``: "all", "this_month", "last_month",
+    "this_year", "last_year", a year ("2024") or a month ("2024-05")
+    """
+    month = month_start(now or datetime.utcnow())
+    named = {
+        "all": ALL_TIME,
+        "this_month": month.strftime("%Y-%m"),
+        "last_month": shift_months(month, -1).strftime("%Y-%m"),
+        "this_year": f"{month.year:04d}",
+        "last_year": f"{month.year - 1:04d}",
+    }
+    if period in named:
+        return named[period]
+    for fmt in ("%Y", "%Y-%m"):
+        try:
+            parsed = datetime.strptime(period, fmt)
+        except ValueError:
+            continue
+        return parsed.strftime(fmt)
+    raise InvalidLeaderboard(
+        f"period must be one of {', '.join(named)}, a year (YYYY) or a month (YYYY-MM)")
+
+
+async def leaderboard(db, period: str = "all", metric: str = "sales_volume", limit: int = 10,
+                      now: Optional[datetime] = None) -> Dict[str, Any]:
+    """The top ``limit`` agents by ``metric`` within ``period``; agents with nothing to rank are left out"""
+    if metric not in RANKED_METRICS:
+        raise InvalidLeaderboard(f"metric must be one of {', '.join(RANKED_METRICS)}")
+    stored = resolve_period(period, now)
+    docs = await db[METRICS].find(
+        {"period": stored, metric: {"$gt": 0}}
+    ).sort([(metric, -1), ("agent_id", 1)]).limit(limit).to_list(limit)
+    return {
+        "period": stored,
+        "metric": metric,
+        "agents": [
+            {
+                "rank": rank,
+                "agent_id": doc["agent_id"],
+                **{field: doc.get(field, 0) for field in METRIC_FIELDS},
+                "stages": {stage: count for stage, count in (doc.get("stages") or {}).items() if count},
+            }
+            for rank, doc in enumerate(docs, start=1)
+        ],
+    }
+
+
+async def _main(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    count = await rebuild_metrics(client[args.database])
+    print(f"Rebuilt {count} agent metric documents")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-agent performance metrics")
+    parser.add_argument("--database", default=os.getenv("MONGODB_DATABASE", "real_estate_erp"))
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Authentication hot path.
+
+bcrypt is deliberately slow (hundreds of milliseconds per hash), so
+``PasswordHasher`` runs it on a small dedicated thread pool. A login
+burst queues there instead of stalling the event loop, and the pool's
+size caps how many CPU cores logins can take from request handling.
+
+``TokenCache`` keeps decoded access-token claims per worker, keyed by a
+digest of the token, so an authenticated request normally costs one
+dictionary lookup instead of a signature check. An entry never outlives
+the token's ``exp`` claim. Only successfully validated tokens are
+cached, so garbage tokens cannot flush out good ones.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, context, max_workers: int):
+        self.context = context
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry[1]
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = time.time() + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires = min(expires, claims["exp"])
+        key = self._key(token)
+        self._entries[key] = (expires, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def discard(self, token: str) -> None:
+        self._entries.pop(self._key(token), None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def decode_token(token: str, secret: str, algorithm: str, cache: TokenCache,
+                 token_type: str = "access") -> Dict[str, Any]:
+    """Validated claims of ``token``; raises InvalidToken"""
+    claims = cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, secret, algorithms=[algorithm])
+        except JWTError as e:
+            raise InvalidToken(str(e))
+        if claims.get("sub") is None:
+            raise InvalidToken("Token has no subject")
+        cache.put(token, claims)
+    # Checked on every call: the cache holds tokens of any type
+    # Tokens issued before token types were introduced count as access tokens
+    if claims.get("type", "access") != token_type:
+        raise InvalidToken(f"Expected a {token_type} token")
+    return claims
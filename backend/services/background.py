@@ -0,0 +1,127 @@
+"""
+Background jobs and their coordination.
+
+``run_periodically`` runs a job now and then every ``interval`` seconds
+until cancelled, logging failures without stopping.
+
+serve.py runs one process per CPU and every process starts the same
+jobs. A job that must not overlap itself across workers runs inside
+``single_runner``, which claims a lease document in ``job_leases``
+(owner and expiry) with one conditional upsert: only the worker whose
+upsert matches an expired lease gets it, the others hit the unique
+``_id`` and skip their turn. Jobs started on request rather than on a
+timer call ``claim`` and release the ``Lease`` when they finish.
+
+The holder renews the lease while it works, so one that dies frees it
+within ``ttl`` seconds. A lease can still be lost to a long pause, so
+jobs stay safe to overlap (unique scratch collections, idempotent
+writes) and the lease only keeps them from doing so routinely.
+"""
+import asyncio
+import logging
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+LEASES = "job_leases"
+DEFAULT_TTL_SECONDS = 60.0
+
+
+class Lease:
+    """A claimed lease, renewed in the background until released"""
+
+    def __init__(self, db, name: str, owner: str, ttl: float, claimed_at: datetime):
+        self.db = db
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.claimed_at = claimed_at
+        self._renewer = asyncio.create_task(self._renew())
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                result = await self.db[LEASES].update_one(
+                    {"_id": self.name, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}},
+                )
+            except PyMongoError:
+                logger.warning("Could not renew the %s lease", self.name, exc_info=True)
+                continue
+            if not result.matched_count:
+                logger.warning("Lost the %s lease to another worker", self.name)
+                return
+
+    async def release(self, hold: float = 0) -> None:
+        """Stop renewing; the lease stays taken until ``hold`` seconds after it was claimed"""
+        self._renewer.cancel()
+        await asyncio.gather(self._renewer, return_exceptions=True)
+        try:
+            await self.db[LEASES].update_one(
+                {"_id": self.name, "owner": self.owner},
+                {"$set": {"expires_at": max(self.claimed_at + timedelta(seconds=hold), datetime.utcnow())}},
+            )
+        except PyMongoError:
+            logger.warning("Could not release the %s lease; it expires on its own", self.name, exc_info=True)
+
+
+async def claim(db, name: str, ttl: float = DEFAULT_TTL_SECONDS) -> Optional[Lease]:
+    """The lease ``name`` if no other process holds it, else None"""
+    owner = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+    now = datetime.utcnow()
+    try:
+        await db[LEASES].update_one(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {"$set": {"owner": owner, "claimed_at": now, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists and has not expired
+        return None
+    return Lease(db, name, owner, ttl, now)
+
+
+@asynccontextmanager
+async def single_runner(db, name: str, hold: float = 0, ttl: float = DEFAULT_TTL_SECONDS) -> AsyncIterator[bool]:
+    """
+    Yield True when this process holds the lease ``name``, False when
+    another one does. On exit the lease is kept until ``hold`` seconds
+    after it was claimed, so a periodic job passes ``hold=interval`` and
+    the other workers skip the rest of that interval.
+    """
+    lease = await claim(db, name, ttl)
+    if lease is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        await lease.release(hold)
+
+
+async def run_periodically(job: Callable[[], Awaitable[Any]], interval: float, name: str, db=None) -> None:
+    """
+    Run ``job()`` now and then every ``interval`` seconds. With ``db``,
+    each round runs on one worker only, under the lease ``name``.
+    """
+    while True:
+        try:
+            if db is None:
+                await job()
+            else:
+                async with single_runner(db, name, hold=interval) as claimed:
+                    if claimed:
+                        await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background job %s failed", name)
+        await asyncio.sleep(interval)
@@ -0,0 +1,105 @@
+"""
+Batch inserts and upserts.
+
+A whole batch goes to MongoDB in a single ``bulk_write``. Per-item
+results are derived from the write result and the ``_id`` values
+assigned client-side, so nothing is read back afterwards. Upserts on an
+external key prefetch the matching documents in one query. That tells us
+which items update existing records, and gives the previous state to
+anything that maintains derived data.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Fields that must keep their first-written value when upserting
+INSERT_ONLY_FIELDS = ("_id", "created_at")
+
+
+def parse_items(body: bytes, content_type: str) -> List[Any]:
+    """Decode a JSON array or an NDJSON body into a list of raw items"""
+    if "ndjson" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    items = json.loads(body or b"null")
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of records")
+    return items
+
+
+async def bulk_write_documents(
+    collection,
+    items: List[Tuple[int, Dict[str, Any]]],
+    upsert_key: Optional[str] = None,
+    ordered: bool = False,
+) -> Tuple[List[Dict[str, Any]], List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]]:
+    """
+    Write ``items`` (pairs of request index and document) in one batch.
+
+    Returns the per-item results and the ``(before, after)`` pairs of the
+    writes that succeeded. ``before`` is None for newly created documents.
+    Items without a value for ``upsert_key`` are plain inserts.
+    """
+    existing: Dict[Any, Dict[str, Any]] = {}
+    if upsert_key:
+        keys = list({doc[upsert_key] for _, doc in items if doc.get(upsert_key) is not None})
+        if keys:
+            async for doc in collection.find({upsert_key: {"$in": keys}}):
+                existing[doc[upsert_key]] = doc
+
+    requests = []
+    previous: List[Optional[Dict[str, Any]]] = []
+    for _, doc in items:
+        key = doc.get(upsert_key) if upsert_key else None
+        before = existing.get(key) if key is not None else None
+        if before is None:
+            # New keys are plain inserts too: should another writer create the
+            # key after the prefetch, the unique index fails this item instead
+            # of it turning into an update reported as "created"
+            doc["_id"] = ObjectId()
+            doc["version"] = 0
+            requests.append(InsertOne(doc))
+        else:
+            doc["_id"] = before["_id"]
+            requests.append(UpdateOne(
+                # Matching on _id too, so the item fails rather than creates a
+                # second document if the key moved off the prefetched one
+                {upsert_key: key, "_id": doc["_id"]},
+                {
+                    "$set": {k: v for k, v in doc.items() if k not in INSERT_ONLY_FIELDS},
+                    "$setOnInsert": {k: doc[k] for k in INSERT_ONLY_FIELDS if k in doc},
+                    "$inc": {"version": 1},
+                },
+                upsert=True,
+            ))
+            # Mirror the $inc so the change pair carries the version just written
+            doc["version"] = before.get("version", 0) + 1
+        previous.append(before)
+        if key is not None:
+            # A later item with the same key updates what this one wrote
+            existing[key] = doc
+
+    errors: Dict[int, str] = {}
+    executed = len(requests)
+    if requests:
+        try:
+            await collection.bulk_write(requests, ordered=ordered)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = error.get("errmsg", "Write failed")
+            if ordered and errors:
+                executed = min(errors) + 1
+
+    results = []
+    changes = []
+    for position, ((index, doc), before) in enumerate(zip(items, previous)):
+        if position >= executed:
+            results.append({"index": index, "status": "skipped"})
+        elif position in errors:
+            results.append({"index": index, "status": "failed", "error": errors[position]})
+        else:
+            results.append({"index": index, "status": "updated" if before else "created", "id": str(doc["_id"])})
+            changes.append((before, doc))
+    return results, changes
@@ -0,0 +1,28 @@
+"""
+Write batches as seen by derived data.
+
+Write handlers report what they wrote as ``(before, after)`` pairs:
+``before`` is None for inserts, ``after`` is None for deletes and may
+hold only the written fields for updates. The dashboard counters,
+finance rollups, agent metrics, document cache, search index and
+matching snapshot all consume these batches.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+Change = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def signed(changes: Iterable[Change]) -> Iterable[Tuple[Dict[str, Any], int]]:
+    """Expand (before, after) pairs into documents to subtract and add"""
+    for before, after in changes:
+        if before:
+            yield before, -1
+        if after:
+            yield {**(before or {}), **after}, 1
+
+
+def safe_key(value: Any) -> Optional[str]:
+    """``value`` if it can be used as a field name in an ``$inc`` path, else None"""
+    if not isinstance(value, str) or not value or "." in value or value.startswith("$"):
+        return None
+    return value
@@ -0,0 +1,80 @@
+"""
+Indexed city search.
+
+Properties store ``city_normalized`` (accent-stripped, casefolded,
+whitespace-collapsed) next to the display ``city``. Lookups normalize the
+search term the same way and query that field with an exact match or an
+anchored, case-sensitive prefix regex, both of which MongoDB answers from
+an index range scan.
+
+Backfill documents written before the field existed with:
+
+    cd backend
+    python -m services.city_search
+"""
+import argparse
+import asyncio
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize_city(value: Optional[str]) -> str:
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def city_filter(city: str, exact: bool = False) -> Dict[str, Any]:
+    normalized = normalize_city(city)
+    if exact:
+        return {"city_normalized": normalized}
+    return {"city_normalized": {"$regex": "^" + re.escape(normalized)}}
+
+
+async def suggest_cities(collection, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Distinct cities starting with ``prefix``, most listed first"""
+    docs = await collection.aggregate([
+        {"$match": city_filter(prefix)},
+        {"$group": {"_id": "$city_normalized", "city": {"$first": "$city"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": limit},
+    ]).to_list(limit)
+    return [{"city": doc["city"], "count": doc["count"]} for doc in docs]
+
+
+async def backfill_city_normalized(collection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Set ``city_normalized`` on every document missing it; safe to re-run"""
+    updated = 0
+    batch = []
+    async for doc in collection.find({"city_normalized": None}, {"city": 1}, batch_size=batch_size):
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"city_normalized": normalize_city(doc.get("city"))}}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def _main(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    updated = await backfill_city_normalized(client[args.database].properties, args.batch_size)
+    print(f"Backfilled city_normalized on {updated} properties")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill normalized city names on properties")
+    parser.add_argument("--database", default=os.getenv("MONGODB_DATABASE", "real_estate_erp"))
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    asyncio.run(_main(parser.parse_args()))
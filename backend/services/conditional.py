@@ -0,0 +1,90 @@
+"""
+Conditional GET support.
+
+Detail responses are validated by the document's ``version`` and
+``updated_at``. List responses are validated by a per-collection change
+marker in the ``change_markers`` collection, which every API write bumps
+with ``touch``. A poll that matches costs one lookup by ``_id`` and
+returns 304 without running the list query or serializing anything.
+
+Writes made outside the API (shell, backfill scripts) do not bump the
+marker. Call ``touch`` from such scripts if clients must see them.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+MARKERS = "change_markers"
+
+
+async def touch(db, collection: str) -> None:
+    """Record that ``collection`` changed; list validators change with it"""
+    await db[MARKERS].update_one(
+        {"_id": collection},
+        {"$inc": {"seq": 1}, "$set": {"changed_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def read_marker(db, collection: str) -> Tuple[int, Optional[datetime]]:
+    marker = await db[MARKERS].find_one({"_id": collection})
+    if marker is None:
+        return 0, None
+    return marker.get("seq", 0), marker.get("changed_at")
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def document_validators(doc: Dict[str, Any], variant: str = "") -> Tuple[str, Optional[datetime]]:
+    """ETag and Last-Modified for one document; ``variant`` covers e.g. a projection"""
+    updated_at = doc.get("updated_at") or doc.get("created_at")
+    return make_etag(doc.get("_id"), doc.get("version", 0), updated_at, variant), updated_at
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    # no-cache: clients may store the body but must revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
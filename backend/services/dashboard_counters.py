@@ -0,0 +1,217 @@
+"""
+Materialized dashboard counters.
+
+Write handlers apply ``$inc`` deltas to a single ``dashboard_counters``
+document so the dashboard reads a handful of precomputed numbers instead
+of aggregating raw collections. A periodic reconciliation rebuilds the
+store from scratch to correct any drift (failed increments, writes made
+outside the API, increments racing a rebuild).
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from services.agent_metrics import leaderboard
+from services.changes import Change, safe_key, signed
+from services.dashboard_stats import (
+    RECENT_TRANSACTIONS_LIMIT,
+    SALES_BY_MONTH_WINDOW,
+    TOP_AGENTS_LIMIT,
+    merge_recent_transactions,
+    month_start,
+    shift_months,
+)
+
+GLOBAL_ID = "global"
+FINANCE_TYPES = ("income", "expense")
+
+
+def _month_key(value: Any) -> Optional[str]:
+    return value.strftime("%Y-%m") if isinstance(value, datetime) else None
+
+
+def _property_inc(doc: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    inc = {"properties.total": sign, "properties.price_sum": sign * (doc.get("price") or 0)}
+    status = safe_key(doc.get("status"))
+    if status:
+        inc[f"properties.by_status.{status}"] = sign
+    prop_type = safe_key(doc.get("property_type"))
+    if prop_type:
+        inc[f"properties.by_type.{prop_type}"] = sign
+    return inc
+
+
+def _merge_inc(*incs: Dict[str, Any]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {}
+    for inc in incs:
+        for key, value in inc.items():
+            merged[key] = merged.get(key, 0) + value
+    return {key: value for key, value in merged.items() if value}
+
+
+async def _apply(db, inc: Dict[str, Any]) -> None:
+    if inc:
+        await db.dashboard_counters.update_one({"_id": GLOBAL_ID}, {"$inc": inc}, upsert=True)
+
+
+def _sale_inc(doc: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    price = doc.get("sale_price") or 0
+    inc = {"sales.count": sign, "sales.volume": sign * price}
+    month = _month_key(doc.get("closing_date"))
+    if month:
+        inc[f"sales.by_month.{month}.count"] = sign
+        inc[f"sales.by_month.{month}.volume"] = sign * price
+    return inc
+
+
+def _finance_inc(doc: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    month = _month_key(doc.get("date"))
+    if not month or doc.get("type") not in FINANCE_TYPES:
+        return {}
+    return {f"finance_by_month.{month}.{doc['type']}": sign * (doc.get("amount") or 0)}
+
+
+async def record_property_changes(db, changes: Iterable[Change]) -> None:
+    """Apply a batch of property writes"""
+    await _apply(db, _merge_inc(*(_property_inc(doc, sign) for doc, sign in signed(changes))))
+
+
+async def record_sale_changes(db, changes: Iterable[Change]) -> None:
+    await _apply(db, _merge_inc(*(_sale_inc(doc, sign) for doc, sign in signed(changes))))
+
+
+async def record_finance_changes(db, changes: Iterable[Change]) -> None:
+    await _apply(db, _merge_inc(*(_finance_inc(doc, sign) for doc, sign in signed(changes))))
+
+
+async def record_sale_created(db, doc: Dict[str, Any]) -> None:
+    await record_sale_changes(db, [(None, doc)])
+
+
+async def record_finance_created(db, doc: Dict[str, Any]) -> None:
+    await record_finance_changes(db, [(None, doc)])
+
+
+async def rebuild_counters(db) -> None:
+    """Recompute the whole store from the source collections"""
+    properties, sales, finance = await asyncio.gather(
+        db.properties.aggregate([
+            {"$facet": {
+                "totals": [{"$group": {"_id": None, "total": {"$sum": 1}, "price_sum": {"$sum": "$price"}}}],
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "by_type": [{"$group": {"_id": "$property_type", "count": {"$sum": 1}}}],
+            }}
+        ]).to_list(1),
+        db.sales.aggregate([
+            {"$facet": {
+                "totals": [{"$group": {"_id": None, "count": {"$sum": 1}, "volume": {"$sum": "$sale_price"}}}],
+                "by_month": [
+                    {"$match": {"closing_date": {"$type": "date"}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m", "date": "$closing_date"}},
+                        "count": {"$sum": 1},
+                        "volume": {"$sum": "$sale_price"},
+                    }},
+                ],
+            }}
+        ]).to_list(1),
+        db.finance_records.aggregate([
+            {"$match": {"type": {"$in": list(FINANCE_TYPES)}, "date": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}}, "type": "$type"},
+                "total": {"$sum": "$amount"},
+            }},
+        ]).to_list(None),
+    )
+    properties, sales = properties[0], sales[0]
+
+    property_totals = (properties["totals"] or [{}])[0]
+    sales_totals = (sales["totals"] or [{}])[0]
+    finance_by_month: Dict[str, Dict[str, float]] = {}
+    for bucket in finance:
+        finance_by_month.setdefault(bucket["_id"]["month"], {})[bucket["_id"]["type"]] = bucket["total"]
+
+    await db.dashboard_counters.replace_one({"_id": GLOBAL_ID}, {
+        "properties": {
+            "total": property_totals.get("total", 0),
+            "price_sum": property_totals.get("price_sum", 0),
+            "by_status": {b["_id"]: b["count"] for b in properties["by_status"] if safe_key(b["_id"])},
+            "by_type": {b["_id"]: b["count"] for b in properties["by_type"] if safe_key(b["_id"])},
+        },
+        "sales": {
+            "count": sales_totals.get("count", 0),
+            "volume": sales_totals.get("volume", 0),
+            "by_month": {b["_id"]: {"count": b["count"], "volume": b["volume"]} for b in sales["by_month"]},
+        },
+        "finance_by_month": finance_by_month,
+        "reconciled_at": datetime.utcnow(),
+    }, upsert=True)
+
+    # Per-agent documents kept here before agent_metrics took them over
+    await db.dashboard_counters.delete_many({"_id": {"$ne": GLOBAL_ID}})
+
+
+async def read_dashboard_counters(db, property_types: Iterable[str], now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    Assemble DashboardStats fields from the materialized store.
+
+    Returns None until the first reconciliation has populated the store,
+    so callers can fall back to a live aggregation.
+    """
+    counters, agents, recent_sales, recent_leases, total_customers = await asyncio.gather(
+        db.dashboard_counters.find_one({"_id": GLOBAL_ID}),
+        leaderboard(db, "all", "sales_volume", TOP_AGENTS_LIMIT),
+        db.sales.find().sort("created_at", -1).limit(RECENT_TRANSACTIONS_LIMIT).to_list(RECENT_TRANSACTIONS_LIMIT),
+        db.leases.find().sort("created_at", -1).limit(RECENT_TRANSACTIONS_LIMIT).to_list(RECENT_TRANSACTIONS_LIMIT),
+        db.customers.estimated_document_count(),
+    )
+    if not counters or "reconciled_at" not in counters:
+        return None
+
+    properties = counters.get("properties", {})
+    sales = counters.get("sales", {})
+    by_status = properties.get("by_status", {})
+    by_type = properties.get("by_type", {})
+    total_properties = properties.get("total", 0)
+
+    current_month = month_start(now)
+    finance = counters.get("finance_by_month", {}).get(_month_key(current_month), {})
+    revenue = finance.get("income", 0)
+    expenses = finance.get("expense", 0)
+
+    window_start = shift_months(current_month, -(SALES_BY_MONTH_WINDOW - 1))
+    sales_by_month: List[Dict[str, Any]] = []
+    for offset in range(SALES_BY_MONTH_WINDOW):
+        month = _month_key(shift_months(window_start, offset))
+        bucket = sales.get("by_month", {}).get(month, {})
+        sales_by_month.append({
+            "month": month,
+            "sales_count": bucket.get("count", 0),
+            "sales_volume": bucket.get("volume", 0),
+        })
+
+    return {
+        "total_properties": total_properties,
+        "available_properties": by_status.get("available", 0),
+        "sold_properties": by_status.get("sold", 0),
+        "leased_properties": by_status.get("leased", 0),
+        "total_customers": total_customers,
+        "active_leads": total_customers,  # Customers carry no lead status yet
+        "monthly_revenue": revenue,
+        "monthly_expenses": expenses,
+        "net_profit": revenue - expenses,
+        "total_sales_volume": sales.get("volume", 0),
+        "average_property_price": properties.get("price_sum", 0) / total_properties if total_properties else 0,
+        "properties_by_type": {prop_type: by_type.get(prop_type, 0) for prop_type in property_types},
+        "sales_by_month": sales_by_month,
+        "top_agents": [
+            {
+                "agent_id": agent["agent_id"],
+                "sales_count": agent["sales_count"],
+                "sales_volume": agent["sales_volume"],
+                "commission": agent["commission"],
+            }
+            for agent in agents["agents"]
+        ],
+        "recent_transactions": merge_recent_transactions(recent_sales, recent_leases),
+    }
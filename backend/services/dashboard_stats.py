@@ -0,0 +1,169 @@
+"""
+Dashboard statistics engine.
+
+Every collection contributes its metrics through a single aggregation
+pipeline (using $facet where several metrics share one scan) and the
+pipelines run concurrently, instead of one round trip per number.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+SALES_BY_MONTH_WINDOW = 12
+TOP_AGENTS_LIMIT = 5
+RECENT_TRANSACTIONS_LIMIT = 10
+
+
+def month_start(now: Optional[datetime] = None) -> datetime:
+    """Midnight on the first day of the month containing ``now``"""
+    now = now or datetime.utcnow()
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def shift_months(month: datetime, months: int) -> datetime:
+    """Move a first-of-month datetime by a number of calendar months"""
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def properties_pipeline() -> List[Dict[str, Any]]:
+    return [
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "count": {"$sum": 1}, "avg_price": {"$avg": "$price"}}}
+            ],
+            "by_status": [
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ],
+            "by_type": [
+                {"$group": {"_id": "$property_type", "count": {"$sum": 1}}}
+            ],
+        }}
+    ]
+
+
+def finance_pipeline(current_month: datetime) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {"type": {"$in": ["income", "expense"]}, "date": {"$gte": current_month}}},
+        {"$group": {"_id": "$type", "total": {"$sum": "$amount"}}},
+    ]
+
+
+def sales_pipeline(window_start: datetime) -> List[Dict[str, Any]]:
+    return [
+        {"$facet": {
+            "volume": [
+                {"$group": {"_id": None, "total": {"$sum": "$sale_price"}}}
+            ],
+            "by_month": [
+                {"$match": {"closing_date": {"$gte": window_start}}},
+                {"$group": {
+                    "_id": {"year": {"$year": "$closing_date"}, "month": {"$month": "$closing_date"}},
+                    "sales_count": {"$sum": 1},
+                    "sales_volume": {"$sum": "$sale_price"},
+                }},
+            ],
+            "top_agents": [
+                # Closed deals only, as in agent_metrics and /api/agents/leaderboard
+                {"$match": {"status": "closed", "agent_id": {"$nin": [None, ""]}}},
+                {"$group": {
+                    "_id": "$agent_id",
+                    "sales_count": {"$sum": 1},
+                    "sales_volume": {"$sum": "$sale_price"},
+                    "commission": {"$sum": "$commission_amount"},
+                }},
+                {"$sort": {"sales_volume": -1}},
+                {"$limit": TOP_AGENTS_LIMIT},
+            ],
+            "recent": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": RECENT_TRANSACTIONS_LIMIT},
+            ],
+        }}
+    ]
+
+
+async def _first(cursor) -> Dict[str, Any]:
+    docs = await cursor.to_list(1)
+    return docs[0] if docs else {}
+
+
+def _fill_months(buckets: List[Dict[str, Any]], window_start: datetime) -> List[Dict[str, Any]]:
+    """Expand grouped month buckets into a gap-free series covering the window"""
+    by_key = {(b["_id"]["year"], b["_id"]["month"]): b for b in buckets}
+    series = []
+    for offset in range(SALES_BY_MONTH_WINDOW):
+        month = shift_months(window_start, offset)
+        bucket = by_key.get((month.year, month.month), {})
+        series.append({
+            "month": month.strftime("%Y-%m"),
+            "sales_count": bucket.get("sales_count", 0),
+            "sales_volume": bucket.get("sales_volume", 0),
+        })
+    return series
+
+
+def merge_recent_transactions(sales: List[Dict[str, Any]], leases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Interleave the newest sales and leases, newest first"""
+    tagged = [{**doc, "transaction_type": "sale"} for doc in sales]
+    tagged += [{**doc, "transaction_type": "lease"} for doc in leases]
+    tagged.sort(key=lambda doc: doc.get("created_at") or datetime.min, reverse=True)
+    return tagged[:RECENT_TRANSACTIONS_LIMIT]
+
+
+async def compute_dashboard_stats(db, property_types: Iterable[str], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Compute every DashboardStats field in one concurrent batch of queries.
+
+    ``recent_transactions`` holds raw MongoDB documents; the caller is
+    responsible for serializing them.
+    """
+    current_month = month_start(now)
+    window_start = shift_months(current_month, -(SALES_BY_MONTH_WINDOW - 1))
+
+    properties, finance, sales, recent_leases, total_customers = await asyncio.gather(
+        _first(db.properties.aggregate(properties_pipeline())),
+        db.finance_records.aggregate(finance_pipeline(current_month)).to_list(None),
+        _first(db.sales.aggregate(sales_pipeline(window_start))),
+        db.leases.find().sort("created_at", -1).limit(RECENT_TRANSACTIONS_LIMIT).to_list(RECENT_TRANSACTIONS_LIMIT),
+        db.customers.estimated_document_count(),
+    )
+
+    totals = (properties.get("totals") or [{}])[0]
+    by_status = {b["_id"]: b["count"] for b in properties.get("by_status", [])}
+    properties_by_type = {prop_type: 0 for prop_type in property_types}
+    for bucket in properties.get("by_type", []):
+        if bucket["_id"] in properties_by_type:
+            properties_by_type[bucket["_id"]] = bucket["count"]
+
+    finance_totals = {b["_id"]: b["total"] for b in finance}
+    revenue = finance_totals.get("income", 0)
+    expenses = finance_totals.get("expense", 0)
+
+    volume = (sales.get("volume") or [{}])[0]
+
+    return {
+        "total_properties": totals.get("count", 0),
+        "available_properties": by_status.get("available", 0),
+        "sold_properties": by_status.get("sold", 0),
+        "leased_properties": by_status.get("leased", 0),
+        "total_customers": total_customers,
+        "active_leads": total_customers,  # Customers carry no lead status yet
+        "monthly_revenue": revenue,
+        "monthly_expenses": expenses,
+        "net_profit": revenue - expenses,
+        "total_sales_volume": volume.get("total", 0),
+        "average_property_price": totals.get("avg_price") or 0,
+        "properties_by_type": properties_by_type,
+        "sales_by_month": _fill_months(sales.get("by_month", []), window_start),
+        "top_agents": [
+            {
+                "agent_id": agent["_id"],
+                "sales_count": agent["sales_count"],
+                "sales_volume": agent["sales_volume"],
+                "commission": agent["commission"],
+            }
+            for agent in sales.get("top_agents", [])
+        ],
+        "recent_transactions": merge_recent_transactions(sales.get("recent", []), recent_leases),
+    }
@@ -0,0 +1,132 @@
+"""
+Read-through cache for single-document lookups by ``_id``.
+
+Each worker keeps an in-process LRU with a TTL (an ``AsyncTTLCache``) in
+front of MongoDB. An optional shared backend (Redis, or the in-memory
+stand-in for local runs) sits between the LRU and MongoDB so workers can
+reuse each other's loads. Concurrent misses for the same id share a
+single query.
+
+Writes go through ``put`` / ``invalidate`` / ``apply_changes``, which
+update this worker's LRU and the shared backend. Other workers' LRUs are
+not notified, so their copies can lag a write by up to the TTL.
+"""
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import bson
+
+from services.changes import Change
+from services.ttl_cache import AsyncTTLCache
+
+
+class MemoryBackend:
+    """Shared-backend stand-in for development and tests (one process only)"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._values[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("DOCUMENT_CACHE_URL points at Redis but the 'redis' package is not installed")
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+
+def shared_backend_from_url(url: Optional[str]):
+    """``redis://...`` for Redis, ``memory://`` for the stand-in, empty for none"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported document cache URL: {url}")
+
+
+class DocumentCache:
+    def __init__(self, collection, maxsize: int, ttl: float, shared=None):
+        self.collection = collection
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._local = AsyncTTLCache(ttl, maxsize)
+        self.counters = {"shared_hits": 0, "misses": 0}
+
+    def _shared_key(self, doc_id: Any) -> str:
+        return f"doc:{self.collection.name}:{doc_id}"
+
+    async def get(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        """The document with ``_id`` == ``doc_id`` (a copy the caller may modify), or None"""
+        doc = await self._local.get(doc_id, lambda: self._load(doc_id))
+        return dict(doc) if doc is not None else None
+
+    async def _load(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        if self.shared is not None:
+            raw = await self.shared.get(self._shared_key(doc_id))
+            if raw is not None:
+                self.counters["shared_hits"] += 1
+                return bson.decode(raw)
+        self.counters["misses"] += 1
+        doc = await self.collection.find_one({"_id": doc_id})
+        # Not when a write overtook this load: it must not overwrite the shared copy
+        if doc is not None and self.shared is not None and self._local.is_current(doc_id):
+            await self.shared.set(self._shared_key(doc_id), bson.encode(doc), self.ttl)
+        return doc
+
+    async def put(self, doc: Dict[str, Any]) -> None:
+        """Refresh the cached copy with a document that was just written in full"""
+        self._local.set(doc["_id"], dict(doc))
+        if self.shared is not None:
+            await self.shared.set(self._shared_key(doc["_id"]), bson.encode(doc), self.ttl)
+
+    async def invalidate(self, doc_id: Any) -> None:
+        self._local.invalidate(doc_id)
+        if self.shared is not None:
+            await self.shared.delete(self._shared_key(doc_id))
+
+    async def apply_changes(self, changes: Iterable[Change]) -> None:
+        """Apply a batch of writes (see ``services.changes``)"""
+        for before, after in changes:
+            if after is None:
+                await self.invalidate(before["_id"])
+            else:
+                await self.put({**(before or {}), **after})
+
+    def stats(self) -> Dict[str, Any]:
+        local = self._local.counters
+        lookups = local["hits"] + self.counters["shared_hits"] + self.counters["misses"]
+        hits = local["hits"] + self.counters["shared_hits"]
+        return {
+            "hits": local["hits"],
+            **self.counters,
+            "coalesced": local["coalesced"],
+            "evictions": local["evictions"],
+            "size": len(self._local),
+            "maxsize": self.maxsize,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,141 @@
+"""
+Change feed for server-sent events.
+
+One background feed per worker watches MongoDB for writes and hands them
+to an ``EventHub``. Every subscriber (an open ``/api/events`` stream) has
+its own pending delta, so a burst of writes, or a slow client, is
+coalesced into one message listing what changed per collection. Clients
+then refetch what they display (cheaply, with conditional GETs) instead
+of polling on a timer.
+
+The feed uses a change stream when the deployment supports one (replica
+set or sharded cluster). On a standalone server it falls back to polling
+the ``change_markers`` that API writes bump. That fallback cannot report
+operation types and misses writes made outside the API.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from services.conditional import MARKERS
+from services.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# "$changeStream is only supported on replica sets" and friends
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40602}
+CHANGE_STREAM_HISTORY_LOST = 286
+WATCHED_OPERATIONS = ["insert", "update", "replace", "delete"]
+
+Delta = Dict[str, Dict[str, int]]  # collection -> operation -> count
+
+
+class Subscription:
+    def __init__(self):
+        self.pending: Delta = {}
+        self.wakeup = asyncio.Event()
+
+
+class EventHub:
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self.mode: Optional[str] = None  # "change_stream" or "polling" once the feed runs
+        self._subscriptions: Set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def publish(self, collection: str, operation: str = "change", count: int = 1) -> None:
+        for subscription in self._subscriptions:
+            counts = subscription.pending.setdefault(collection, {})
+            counts[operation] = counts.get(operation, 0) + count
+            subscription.wakeup.set()
+
+    async def next_delta(self, subscription: Subscription, timeout: float) -> Optional[Delta]:
+        """
+        Wait for changes, give the burst ``debounce`` seconds to settle and
+        return everything pending as one delta. None after ``timeout``
+        seconds without changes (time for a keepalive).
+        """
+        try:
+            await asyncio.wait_for(subscription.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        await asyncio.sleep(self.debounce)
+        delta, subscription.pending = subscription.pending, {}
+        subscription.wakeup.clear()
+        return delta
+
+
+def format_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def _marker_seqs(db, collections: Iterable[str]) -> Dict[str, int]:
+    cursor = db[MARKERS].find({"_id": {"$in": list(collections)}}, {"seq": 1})
+    return {marker["_id"]: marker.get("seq", 0) async for marker in cursor}
+
+
+async def poll_markers(db, hub: EventHub, collections: Iterable[str], interval: float) -> None:
+    """Polling stand-in for a change stream: publish collections whose marker moved"""
+    collections = list(collections)
+    last = await _marker_seqs(db, collections)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await _marker_seqs(db, collections)
+        except PyMongoError:
+            logger.exception("Polling change markers failed")
+            continue
+        for collection, seq in current.items():
+            if seq != last.get(collection, 0):
+                hub.publish(collection, count=seq - last.get(collection, 0))
+        last = current
+
+
+async def feed_forever(db, hub: EventHub, collections: Iterable[str], poll_interval: float,
+                       source: str = "auto") -> None:
+    """Background job: feed ``hub`` from a change stream, or by polling where there is none"""
+    collections = list(collections)
+    if source == "polling":
+        hub.mode = "polling"
+        await poll_markers(db, hub, collections, poll_interval)
+        return
+
+    pipeline = [{"$match": {"ns.coll": {"$in": collections}, "operationType": {"$in": WATCHED_OPERATIONS}}}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, resume_after=resume_token) as stream:
+                hub.mode = "change_stream"
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    hub.publish(change["ns"]["coll"], change["operationType"])
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                logger.info("Change streams unavailable (%s), polling change markers instead", e)
+                hub.mode = "polling"
+                await poll_markers(db, hub, collections, poll_interval)
+                return
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                # Changes were missed: start afresh and have everyone refetch
+                resume_token = None
+                for collection in collections:
+                    hub.publish(collection, "invalidate")
+            else:
+                logger.exception("Change stream failed, resuming")
+        except PyMongoError:
+            logger.exception("Change stream interrupted, resuming")
+        await asyncio.sleep(poll_interval)
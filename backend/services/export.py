@@ -0,0 +1,63 @@
+"""
+Streaming bulk export.
+
+Documents are pulled from the Motor cursor batch by batch and written out
+as NDJSON or CSV chunks, so memory use is bounded by the batch size no
+matter how many documents the export covers.
+"""
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, AsyncIterator, List, Sequence
+
+from bson import ObjectId
+
+from services.serialization import api_doc, dumps
+
+ROWS_PER_CHUNK = 500
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def stream_ndjson(cursor) -> AsyncIterator[bytes]:
+    lines: List[bytes] = []
+    try:
+        async for doc in cursor:
+            lines.append(dumps(api_doc(doc)))
+            if len(lines) >= ROWS_PER_CHUNK:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    finally:
+        await cursor.close()
+
+
+async def stream_csv(cursor, columns: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    try:
+        async for doc in cursor:
+            doc = api_doc(doc)
+            writer.writerow([_csv_cell(doc.get(column)) for column in columns])
+            rows += 1
+            if rows >= ROWS_PER_CHUNK:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+        yield buffer.getvalue().encode()
+    finally:
+        await cursor.close()
@@ -0,0 +1,132 @@
+"""
+Geospatial property search.
+
+Properties carry a GeoJSON ``location`` point derived from ``latitude`` /
+``longitude`` and indexed with 2dsphere. Radius, bounding-box and polygon
+searches all run as one ``$geoNear`` stage (with ``$geoWithin`` for the
+shapes), so results come back nearest first with ``distance_m`` attached.
+
+Pages continue from the last distance: the cursor stores that distance
+plus the ids already returned at exactly that distance, and the next page
+starts at ``minDistance`` while excluding those ids.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+from services.pagination import InvalidPageRequest, decode_token, encode_token
+
+Coordinates = List[float]  # GeoJSON order: [longitude, latitude]
+BAD_VALUE = 2  # Server error code for a shape it cannot use
+
+
+class InvalidShape(ValueError):
+    """Raised for shapes the server rejects, e.g. polygons whose edges cross"""
+
+
+def point(lat: float, lng: float) -> Dict[str, Any]:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def location_from(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """GeoJSON point for a property document, None without valid coordinates"""
+    lat, lng = doc.get("latitude"), doc.get("longitude")
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return point(lat, lng)
+
+
+def bbox_polygon(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> Dict[str, Any]:
+    if min_lat >= max_lat or min_lng >= max_lng:
+        raise ValueError("Bounding box minimums must be below its maximums")
+    ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def parse_polygon(text: str) -> Dict[str, Any]:
+    """Parse ``"lng,lat;lng,lat;..."`` into a closed GeoJSON polygon"""
+    try:
+        ring = [[float(part) for part in pair.split(",")] for pair in text.split(";") if pair.strip()]
+    except ValueError:
+        raise ValueError("Polygon must be 'lng,lat;lng,lat;...'")
+    if any(len(vertex) != 2 for vertex in ring):
+        raise ValueError("Polygon must be 'lng,lat;lng,lat;...'")
+    if not all(-180 <= lng <= 180 and -90 <= lat <= 90 for lng, lat in ring):
+        raise ValueError("Polygon vertices must lie within longitude -180..180 and latitude -90..90")
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len(ring) < 4:
+        raise ValueError("Polygon needs at least three distinct vertices")
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def polygon_center(polygon: Dict[str, Any]) -> Dict[str, Any]:
+    """Vertex average of a polygon's outer ring, used to order results"""
+    ring = polygon["coordinates"][0][:-1]
+    lng = sum(vertex[0] for vertex in ring) / len(ring)
+    lat = sum(vertex[1] for vertex in ring) / len(ring)
+    return point(lat, lng)
+
+
+def within_filter(polygon: Dict[str, Any]) -> Dict[str, Any]:
+    return {"location": {"$geoWithin": {"$geometry": polygon}}}
+
+
+def _decode_geo_cursor(cursor: str) -> Tuple[float, List[Any]]:
+    payload = decode_token(cursor)
+    try:
+        return float(payload["d"]), list(payload["ids"])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidPageRequest("Malformed cursor")
+
+
+async def nearest_page(collection, near: Dict[str, Any], query: Dict[str, Any], limit: int,
+                       cursor: Optional[str] = None, max_distance: Optional[float] = None
+                       ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of documents ordered by distance from ``near``, with the next cursor"""
+    geo_near: Dict[str, Any] = {
+        "near": near,
+        "key": "location",
+        "distanceField": "distance_m",
+        "spherical": True,
+    }
+    seen_at_boundary: List[Any] = []
+    if cursor:
+        min_distance, seen_at_boundary = _decode_geo_cursor(cursor)
+        geo_near["minDistance"] = min_distance
+        exclude = {"_id": {"$nin": seen_at_boundary}}
+        query = {"$and": [query, exclude]} if query else exclude
+    if max_distance is not None:
+        geo_near["maxDistance"] = max_distance
+    if query:
+        geo_near["query"] = query
+
+    limit = max(limit, 1)
+    try:
+        docs = await collection.aggregate([{"$geoNear": geo_near}, {"$limit": limit + 1}]).to_list(limit + 1)
+    except OperationFailure as e:
+        # Only the server checks a ring for self-intersection
+        if e.code == BAD_VALUE:
+            raise InvalidShape(f"Invalid shape: {(e.details or {}).get('errmsg', e)}")
+        raise
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last_distance = docs[-1]["distance_m"]
+    boundary = [doc["_id"] for doc in docs if doc["distance_m"] == last_distance]
+    if cursor and last_distance == geo_near["minDistance"]:
+        boundary += seen_at_boundary
+    return docs, encode_token({"d": last_distance, "ids": boundary})
+
+
+async def backfill_locations(collection) -> int:
+    """Derive ``location`` server-side for documents with coordinates but no point"""
+    result = await collection.update_many(
+        {
+            "location": {"$exists": False},
+            "latitude": {"$gte": -90, "$lte": 90},
+            "longitude": {"$gte": -180, "$lte": 180},
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+    )
+    return result.modified_count
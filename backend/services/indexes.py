@@ -0,0 +1,260 @@
+"""
+Index registry and query-plan diagnostics.
+
+``INDEXES`` declares every index the API relies on, shaped after the
+filters and sorts the endpoints in main.py issue (equality fields first,
+then the sort key, then ranges, with ``_id`` last for keyset pagination).
+``ensure_indexes`` applies the registry idempotently at startup.
+
+``canonical_queries`` mirrors the query shape of each endpoint.
+``check_query_plans`` runs ``explain`` on them and flags any that fall
+back to a collection scan. Run it from the command line to gate deploys:
+
+    cd backend
+    python -m services.indexes --apply --check
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from services.property_search import TEXT_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+HAS_EXTERNAL_ID = {"external_id": {"$type": "string"}}
+HAS_EMAIL = {"email": {"$type": "string"}}
+
+
+def _external_id_index() -> IndexModel:
+    return IndexModel([("external_id", ASCENDING)], name="external_id_unique",
+                      unique=True, partialFilterExpression=HAS_EXTERNAL_ID)
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "properties": [
+        IndexModel([("property_type", ASCENDING), ("status", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)],
+                   name="type_status_price"),
+        IndexModel([("status", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="status_price"),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price"),
+        IndexModel([("area", ASCENDING), ("_id", ASCENDING)], name="area"),
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at"),
+        IndexModel([("city_normalized", ASCENDING), ("_id", ASCENDING)], name="city_normalized"),
+        IndexModel([("location", GEOSPHERE), ("status", ASCENDING), ("property_type", ASCENDING), ("price", ASCENDING)],
+                   name="location_geo"),
+        IndexModel([(field, TEXT) for field in TEXT_WEIGHTS], name="property_text", weights=TEXT_WEIGHTS),
+        _external_id_index(),
+    ],
+    "customers": [
+        IndexModel([("last_name", ASCENDING), ("_id", ASCENDING)], name="last_name"),
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at"),
+        # Unique, so two bulk upserts on one email cannot both create it
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True, partialFilterExpression=HAS_EMAIL),
+        _external_id_index(),
+    ],
+    "sales": [
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+        IndexModel([("closing_date", ASCENDING), ("_id", ASCENDING)], name="closing_date"),
+        IndexModel([("sale_price", ASCENDING), ("_id", ASCENDING)], name="sale_price"),
+        IndexModel([("agent_id", ASCENDING), ("closing_date", ASCENDING)], name="agent_closing_date"),
+        _external_id_index(),
+    ],
+    "leases": [
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+        IndexModel([("lease_end", ASCENDING), ("_id", ASCENDING)], name="lease_end"),
+        IndexModel([("status", ASCENDING), ("lease_end", ASCENDING), ("_id", ASCENDING)], name="status_lease_end"),
+        IndexModel([("monthly_rent", ASCENDING), ("_id", ASCENDING)], name="monthly_rent"),
+        _external_id_index(),
+    ],
+    "finance_records": [
+        IndexModel([("type", ASCENDING), ("category", ASCENDING), ("_id", ASCENDING)], name="type_category"),
+        IndexModel([("type", ASCENDING), ("date", ASCENDING)], name="type_date"),
+        IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date"),
+        IndexModel([("amount", ASCENDING), ("_id", ASCENDING)], name="amount"),
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+        _external_id_index(),
+    ],
+    "lease_renewals": [
+        IndexModel([("state", ASCENDING), ("lease_end", ASCENDING), ("_id", ASCENDING)], name="state_lease_end"),
+        IndexModel([("state", ASCENDING), ("seen_at", ASCENDING)], name="state_seen_at"),
+    ],
+    "finance_rollups": [
+        IndexModel([("grain", ASCENDING), ("period", ASCENDING)], name="grain_period"),
+    ],
+    "agent_metrics": [
+        IndexModel([("period", ASCENDING), ("sales_volume", DESCENDING), ("agent_id", ASCENDING)], name="period_sales_volume"),
+        IndexModel([("period", ASCENDING), ("commission", DESCENDING), ("agent_id", ASCENDING)], name="period_commission"),
+        IndexModel([("period", ASCENDING), ("sales_count", DESCENDING), ("agent_id", ASCENDING)], name="period_sales_count"),
+        IndexModel([("period", ASCENDING), ("lease_count", DESCENDING), ("agent_id", ASCENDING)], name="period_lease_count"),
+        IndexModel([("period", ASCENDING), ("commission_income", DESCENDING), ("agent_id", ASCENDING)],
+                   name="period_commission_income"),
+    ],
+}
+
+# Indexes superseded by a registry entry: {collection: {old name: replacement}}.
+# ``ensure_indexes`` drops the old one once its replacement exists.
+REPLACED_INDEXES: Dict[str, Dict[str, str]] = {
+    "properties": {"city_ci": "city_normalized"},
+    "customers": {"email": "email_unique"},
+}
+
+
+def canonical_queries() -> List[Dict[str, Any]]:
+    """Representative query per endpoint; keep in step with main.py"""
+    month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return [
+        {"name": "properties: type + status + price range", "collection": "properties",
+         "filter": {"property_type": "residential", "status": "available",
+                    "price": {"$gte": 100000, "$lte": 500000}}},
+        {"name": "properties: status, sorted by price", "collection": "properties",
+         "filter": {"status": "available"}, "sort": {"price": 1, "_id": 1}},
+        {"name": "properties: sorted by created_at", "collection": "properties",
+         "filter": {}, "sort": {"created_at": -1, "_id": -1}},
+        {"name": "properties: city prefix", "collection": "properties",
+         "filter": {"city_normalized": {"$regex": "^aus"}}},
+        {"name": "properties: city backfill", "collection": "properties",
+         "filter": {"city_normalized": None}},
+        {"name": "properties: full-text search", "collection": "properties",
+         "filter": {"$text": {"$search": "pool garden"}, "status": "available"}},
+        {"name": "properties: map viewport", "collection": "properties",
+         "filter": {"status": "available", "location": {"$geoWithin": {"$geometry": {
+             "type": "Polygon",
+             "coordinates": [[[-97.8, 30.2], [-97.6, 30.2], [-97.6, 30.4], [-97.8, 30.4], [-97.8, 30.2]]],
+         }}}}},
+        {"name": "properties: upsert on external_id", "collection": "properties",
+         "filter": {"external_id": {"$in": ["mls-1", "mls-2"]}}},
+        {"name": "customers: sorted by last_name", "collection": "customers",
+         "filter": {}, "sort": {"last_name": 1, "_id": 1}},
+        {"name": "customers: upsert on email", "collection": "customers",
+         "filter": {"email": {"$in": ["a@example.com"]}}},
+        {"name": "sales: recent transactions", "collection": "sales",
+         "filter": {}, "sort": {"created_at": -1}},
+        {"name": "leases: recent transactions", "collection": "leases",
+         "filter": {}, "sort": {"created_at": -1}},
+        {"name": "leases: expiring within a window", "collection": "leases",
+         "filter": {"status": "active", "lease_end": {"$gte": month, "$lte": month.replace(year=month.year + 1)}},
+         "sort": {"lease_end": 1, "_id": 1}},
+        {"name": "leases: renewal queue", "collection": "lease_renewals",
+         "filter": {"state": "pending"}, "sort": {"lease_end": 1, "_id": 1}},
+        {"name": "finance: type + category", "collection": "finance_records",
+         "filter": {"type": "expense", "category": "maintenance"}},
+        {"name": "finance: dashboard monthly totals", "collection": "finance_records",
+         "filter": {"type": {"$in": ["income", "expense"]}, "date": {"$gte": month}}},
+        {"name": "finance: summary over a date range", "collection": "finance_rollups",
+         "filter": {"$or": [{"grain": "month", "period": {"$gte": month.replace(year=month.year - 2), "$lt": month}},
+                            {"grain": "day", "period": {"$gte": month}}]}},
+        {"name": "agents: leaderboard", "collection": "agent_metrics",
+         "filter": {"period": month.strftime("%Y-%m"), "commission": {"$gt": 0}},
+         "sort": {"commission": -1, "agent_id": 1}},
+        {"name": "dashboard: top agents", "collection": "agent_metrics",
+         "filter": {"period": "all", "sales_volume": {"$gt": 0}}, "sort": {"sales_volume": -1, "agent_id": 1}},
+    ]
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every registered index, then drop the ones it replaces.
+    Existing identical indexes are a no-op; conflicts (e.g. duplicate
+    values under a unique index) are logged and reported instead of
+    aborting the rest, and keep the index they would have replaced.
+    """
+    async def create(collection: str, index: IndexModel):
+        try:
+            await db[collection].create_indexes([index])
+            return collection, index.document["name"], None
+        except OperationFailure as e:
+            return collection, index.document["name"], str(e)
+
+    outcomes = await asyncio.gather(*(
+        create(collection, index) for collection, indexes in INDEXES.items() for index in indexes
+    ))
+    report: Dict[str, List[str]] = {"created": [], "failed": [], "dropped": []}
+    for collection, name, error in outcomes:
+        if error:
+            logger.error("Could not create index %s.%s: %s", collection, name, error)
+            report["failed"].append(f"{collection}.{name}: {error}")
+        else:
+            report["created"].append(f"{collection}.{name}")
+
+    existing = {collection: await db[collection].index_information() for collection in REPLACED_INDEXES}
+    for collection, replaced in REPLACED_INDEXES.items():
+        for name, replacement in replaced.items():
+            if name in existing[collection] and f"{collection}.{replacement}" in report["created"]:
+                await db[collection].drop_index(name)
+                report["dropped"].append(f"{collection}.{name}")
+    return report
+
+
+def _collect(plan: Any, key: str) -> List[str]:
+    """Gather every ``key`` value in an explain plan, whatever its nesting"""
+    found: List[str] = []
+    if isinstance(plan, dict):
+        if key in plan:
+            found.append(plan[key])
+        for value in plan.values():
+            found.extend(_collect(value, key))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(_collect(value, key))
+    return found
+
+
+async def check_query_plans(db) -> List[Dict[str, Any]]:
+    """Explain every canonical query and report its winning plan"""
+    async def explain(query: Dict[str, Any]) -> Dict[str, Any]:
+        command: Dict[str, Any] = {"find": query["collection"], "filter": query["filter"], "limit": 100}
+        if "sort" in query:
+            command["sort"] = query["sort"]
+        result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        winning = result.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _collect(winning, "stage")
+        return {
+            "name": query["name"],
+            "collection": query["collection"],
+            "stages": stages,
+            "indexes": sorted(set(_collect(winning, "indexName"))),
+            "collscan": "COLLSCAN" in stages,
+        }
+
+    return list(await asyncio.gather(*(explain(query) for query in canonical_queries())))
+
+
+async def _main(args) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    db = client[args.database]
+    status = 0
+    if args.apply:
+        report = await ensure_indexes(db)
+        print(f"Indexes ensured: {len(report['created'])}, failed: {len(report['failed'])}, "
+              f"dropped: {len(report['dropped'])}")
+        for failure in report["failed"]:
+            print(f"  FAILED {failure}")
+        status = 1 if report["failed"] else status
+    if args.check:
+        for plan in await check_query_plans(db):
+            flag = "COLLSCAN" if plan["collscan"] else "ok"
+            print(f"[{flag:>8}] {plan['name']}: {' > '.join(plan['stages'])} {plan['indexes']}")
+            status = 1 if plan["collscan"] else status
+    client.close()
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the index registry and check query plans")
+    parser.add_argument("--database", default=os.getenv("MONGODB_DATABASE", "real_estate_erp"))
+    parser.add_argument("--apply", action="store_true", help="Create any missing indexes")
+    parser.add_argument("--check", action="store_true", help="Explain canonical queries, exit 1 on COLLSCAN")
+    args = parser.parse_args()
+    if not (args.apply or args.check):
+        parser.error("nothing to do, pass --apply and/or --check")
+    sys.exit(asyncio.run(_main(args)))
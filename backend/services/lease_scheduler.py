@@ -0,0 +1,131 @@
+"""
+Lease expiry and renewal scheduler.
+
+A background job that, on every pass:
+
+* flips active leases whose ``lease_end`` has passed to ``expired``,
+  in batches of ids followed by one ``update_many`` each;
+* upserts active leases ending within the notice window into the
+  ``lease_renewals`` queue (one entry per lease, ``_id`` = the lease's
+  ``_id``), and closes queue entries whose lease left the window: state
+  ``expired`` once the end date passed, ``cancelled`` if the lease was
+  terminated or extended.
+
+Every scan reads a ``lease_end`` range through the (status, lease_end,
+_id) index in keyset order, so a pass touches the leases in the window
+and never the whole collection. Passes run on one worker at a time
+under a lease (``background.run_periodically``). Should two still
+overlap, ``seen_at`` only moves forward, so neither sweeps entries the
+other just saw.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+from services import conditional
+
+logger = logging.getLogger(__name__)
+
+RENEWALS = "lease_renewals"
+ACTIVE = "active"
+EXPIRED = "expired"
+PENDING = "pending"
+RENEWAL_STATES = ("pending", "expired", "cancelled")
+QUEUE_FIELDS = ("property_id", "tenant_id", "agent_id", "monthly_rent", "lease_end")
+
+
+def today(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def expiring_query(start: datetime, end: datetime) -> Dict[str, Any]:
+    """Active leases ending in [start, end]; served by the status_lease_end index"""
+    return {"status": ACTIVE, "lease_end": {"$gte": start, "$lte": end}}
+
+
+async def _scan(leases, query: Dict[str, Any], batch_size: int, projection: Dict[str, Any]):
+    """Yield batches matching ``query`` in (lease_end, _id) order"""
+    last = None
+    while True:
+        page_query = query
+        if last is not None:
+            page_query = {"$and": [query, {"$or": [
+                {"lease_end": {"$gt": last["lease_end"]}},
+                {"lease_end": last["lease_end"], "_id": {"$gt": last["_id"]}},
+            ]}]}
+        batch = await leases.find(page_query, projection).sort(
+            [("lease_end", 1), ("_id", 1)]
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+async def expire_leases(db, now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+    """Flip active leases that ended before today to expired; returns how many"""
+    stamp = now or datetime.utcnow()
+    expired = 0
+    # Flipped leases drop out of the query, so each batch starts from the front again
+    while True:
+        batch = await db.leases.find(
+            {"status": ACTIVE, "lease_end": {"$lt": today(now)}}, {"_id": 1}
+        ).sort([("lease_end", 1), ("_id", 1)]).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        result = await db.leases.update_many(
+            {"_id": {"$in": [lease["_id"] for lease in batch]}, "status": ACTIVE},
+            {"$set": {"status": EXPIRED, "updated_at": stamp}, "$inc": {"version": 1}},
+        )
+        expired += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if expired:
+        await conditional.touch(db, "leases")
+    return expired
+
+
+async def queue_renewals(db, notice_days: int, now: Optional[datetime] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """Bring the renewal queue in line with the active leases ending within ``notice_days``"""
+    stamp = now or datetime.utcnow()
+    start = today(now)
+    projection = {field: 1 for field in QUEUE_FIELDS}
+    queued = 0
+    async for batch in _scan(db.leases, expiring_query(start, start + timedelta(days=notice_days)),
+                             batch_size, projection):
+        result = await db[RENEWALS].bulk_write([
+            UpdateOne(
+                {"_id": lease["_id"]},
+                {
+                    "$set": {**{field: lease.get(field) for field in QUEUE_FIELDS}, "state": PENDING},
+                    "$max": {"seen_at": stamp},
+                    "$unset": {"closed_at": ""},
+                    "$setOnInsert": {"queued_at": stamp},
+                },
+                upsert=True,
+            )
+            for lease in batch
+        ], ordered=False)
+        queued += result.upserted_count
+
+    # Pending entries this pass did not see have left the window
+    stale = {"state": PENDING, "seen_at": {"$lt": stamp}}
+    lapsed = await db[RENEWALS].update_many(
+        {**stale, "lease_end": {"$lt": start}}, {"$set": {"state": "expired", "closed_at": stamp}})
+    cancelled = await db[RENEWALS].update_many(stale, {"$set": {"state": "cancelled", "closed_at": stamp}})
+    report = {"queued": queued, "expired": lapsed.modified_count, "cancelled": cancelled.modified_count}
+    if any(report.values()):
+        await conditional.touch(db, RENEWALS)
+    return report
+
+
+async def run_once(db, notice_days: int, batch_size: int = 1000, now: Optional[datetime] = None) -> Dict[str, int]:
+    expired = await expire_leases(db, now, batch_size)
+    report = {"leases_expired": expired, **await queue_renewals(db, notice_days, now, batch_size)}
+    if any(report.values()):
+        logger.info("Lease scheduler: %s", report)
+    return report
@@ -0,0 +1,343 @@
+"""
+Customer-to-property matching.
+
+``PropertySnapshot`` keeps the available properties of one worker as
+NumPy columns (price, area, type, city), maintained on property writes
+like the in-memory search index and rebuilt periodically. A customer is
+scored against every listing at once:
+
+* hard filters: the listing is available, within the budget (stretched
+  by ``BUDGET_STRETCH`` either side) and of the preferred type, if any;
+* score: budget fit (1 inside the budget, falling to 0 at the stretched
+  edge), same city as the customer, and area per dollar relative to the
+  other candidates, weighted by ``WEIGHTS``.
+
+``match_all_customers`` ranks every customer with a budget against a
+frozen copy of the snapshot, sorted by price per type, so each customer
+only scores the slice within its budget. Scoring runs on a worker thread
+and results are stored in ``customer_matches``, which
+``GET /api/customers/{id}/matches`` serves through ``stored_matches``
+while they are still current, matching live otherwise. Run it from the
+command line, or through ``POST /api/customers/matches/refresh``:
+
+    cd backend
+    python -m services.matching
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from services.background import claim
+from services.changes import Change
+from services.city_search import normalize_city
+
+MATCHES = "customer_matches"
+RUN_LEASE = f"{MATCHES}.run"
+AVAILABLE = "available"
+BUDGET_STRETCH = 0.1
+WEIGHTS = {"budget": 0.6, "city": 0.25, "value": 0.15}
+DEFAULT_LIMIT = 10
+CUSTOMER_FIELDS = {"budget_min": 1, "budget_max": 1, "preferred_property_type": 1, "city": 1}
+PROPERTY_FIELDS = {"status": 1, "price": 1, "area": 1, "property_type": 1, "city": 1, "city_normalized": 1}
+BATCH_SIZE = 5_000
+INITIAL_CAPACITY = 1024
+
+Match = Tuple[Any, float]  # (property _id, score)
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+class _Columns:
+    """The snapshot columns used for scoring, indexed by row"""
+
+    def __init__(self, ids, price, area, type_code, city_code, alive):
+        self.ids, self.price, self.area, self.type_code, self.city_code = ids, price, area, type_code, city_code
+        self.alive = alive
+
+
+class PropertySnapshot:
+    def __init__(self):
+        self._codes: Dict[str, Dict[str, int]] = {"type": {}, "city": {}}
+        self._reset(INITIAL_CAPACITY)
+
+    def _reset(self, capacity: int) -> None:
+        self._ids: List[Any] = [None] * capacity
+        self._price = np.full(capacity, np.nan)
+        self._area = np.full(capacity, np.nan)
+        self._type = np.full(capacity, -1, dtype=np.int32)
+        self._city = np.full(capacity, -1, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._rows: Dict[Any, int] = {}
+        self._free: List[int] = []
+        self._used = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _code(self, kind: str, value: Any) -> int:
+        if not value:
+            return -1
+        codes = self._codes[kind]
+        return codes.setdefault(value, len(codes))
+
+    def _lookup(self, kind: str, value: Any) -> int:
+        return self._codes[kind].get(value, -2) if value else -1
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        self._ids.extend([None] * (capacity - len(self._ids)))
+        for name, fill in (("_price", np.nan), ("_area", np.nan), ("_type", -1), ("_city", -1), ("_alive", False)):
+            column = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        doc_id = doc["_id"]
+        if doc.get("status") != AVAILABLE or not isinstance(doc.get("price"), (int, float)):
+            self.remove(doc_id)
+            return
+        row = self._rows.get(doc_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._used == len(self._ids):
+                    self._grow()
+                row, self._used = self._used, self._used + 1
+            self._rows[doc_id] = row
+        self._ids[row] = doc_id
+        self._price[row] = doc["price"]
+        self._area[row] = _number(doc.get("area"))
+        self._type[row] = self._code("type", doc.get("property_type"))
+        self._city[row] = self._code("city", doc.get("city_normalized") or normalize_city(doc.get("city") or ""))
+        self._alive[row] = True
+
+    def remove(self, doc_id: Any) -> None:
+        row = self._rows.pop(doc_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._ids[row] = None
+            self._free.append(row)
+
+    def apply_changes(self, changes: Iterable[Change]) -> None:
+        """Apply a batch of writes (see ``services.changes``)"""
+        for before, after in changes:
+            if after is None:
+                self.remove(before["_id"])
+            else:
+                self.add({**(before or {}), **after})
+
+    async def rebuild(self, collection) -> None:
+        fresh = PropertySnapshot()
+        fresh._codes = self._codes
+        async for doc in collection.find({"status": AVAILABLE}, PROPERTY_FIELDS, batch_size=BATCH_SIZE):
+            fresh.add(doc)
+        (self._ids, self._price, self._area, self._type, self._city, self._alive,
+         self._rows, self._free, self._used) = (fresh._ids, fresh._price, fresh._area, fresh._type, fresh._city,
+                                               fresh._alive, fresh._rows, fresh._free, fresh._used)
+        self.loaded = True
+
+    def _columns(self, copy: bool = False) -> _Columns:
+        used = self._used
+        columns = [self._price[:used], self._area[:used], self._type[:used], self._city[:used], self._alive[:used]]
+        if copy:
+            # For scoring on another thread while writes keep landing here
+            return _Columns(self._ids[:used], *(column.copy() for column in columns))
+        return _Columns(self._ids, *columns)
+
+    def _wants(self, customer: Dict[str, Any]) -> Tuple[float, float, int, int]:
+        low = customer.get("budget_min") or 0
+        high = customer.get("budget_max") or np.inf
+        return (low * (1 - BUDGET_STRETCH), high * (1 + BUDGET_STRETCH),
+                self._lookup("type", customer.get("preferred_property_type")),
+                self._lookup("city", normalize_city(customer.get("city") or "")))
+
+    def match(self, customer: Dict[str, Any], limit: int = DEFAULT_LIMIT) -> List[Match]:
+        """Best ``limit`` available properties for one customer, best first"""
+        columns = self._columns()
+        low, high, type_code, city_code = self._wants(customer)
+        keep = columns.alive & (columns.price >= low) & (columns.price <= high)
+        if type_code != -1:
+            keep &= columns.type_code == type_code
+        rows = np.flatnonzero(keep)
+        price = columns.price[rows]
+        area_per_dollar = np.nan_to_num(columns.area[rows] / price)
+        top, scores = _rank(price, area_per_dollar, columns.city_code[rows], customer, city_code, limit)
+        return [(columns.ids[rows[i]], score) for i, score in zip(top, scores)]
+
+    def freeze(self) -> "FrozenSnapshot":
+        """Copy of the current listings for batch matching on another thread"""
+        return FrozenSnapshot(self._columns(copy=True), self._wants)
+
+
+class FrozenSnapshot:
+    """
+    Listings as of ``PropertySnapshot.freeze``, with each type's rows in
+    price order so a customer only scores the slice within its budget.
+    Sorting and matching are CPU-bound; run them through
+    ``asyncio.to_thread``.
+    """
+
+    def __init__(self, columns: _Columns, wants):
+        self.columns = columns
+        self._wants = wants
+        self._by_type: Optional[Dict[Optional[int], Tuple[np.ndarray, ...]]] = None
+
+    def __len__(self) -> int:
+        return int(self.columns.alive.sum())
+
+    def _sorted(self) -> Dict[Optional[int], Tuple[np.ndarray, ...]]:
+        if self._by_type is None:
+            columns = self.columns
+            live = np.flatnonzero(columns.alive)
+            groups = {None: live}
+            for code in np.unique(columns.type_code[live]):
+                groups[int(code)] = live[columns.type_code[live] == code]
+            self._by_type = {}
+            for code, rows in groups.items():
+                # Contiguous in price order, so a budget range is a slice rather than a gather
+                rows = rows[np.argsort(columns.price[rows], kind="stable")]
+                price = columns.price[rows]
+                self._by_type[code] = (rows, price, np.nan_to_num(columns.area[rows] / price), columns.city_code[rows])
+        return self._by_type
+
+    def match_many(self, customers: List[Dict[str, Any]], limit: int = DEFAULT_LIMIT) -> List[List[Match]]:
+        by_type = self._sorted()
+        ids = self.columns.ids
+        results = []
+        for customer in customers:
+            low, high, type_code, city_code = self._wants(customer)
+            group = by_type.get(None if type_code == -1 else type_code)
+            if group is None:
+                results.append([])
+                continue
+            rows, price, area_per_dollar, city = group
+            start, end = np.searchsorted(price, low, "left"), np.searchsorted(price, high, "right")
+            top, scores = _rank(price[start:end], area_per_dollar[start:end], city[start:end], customer, city_code, limit)
+            results.append([(ids[rows[start + i]], score) for i, score in zip(top, scores)])
+        return results
+
+
+def _rank(price: np.ndarray, area_per_dollar: np.ndarray, city: np.ndarray, customer: Dict[str, Any],
+          city_code: int, limit: int) -> Tuple[np.ndarray, List[float]]:
+    """Positions of the best ``limit`` candidates, best first, and their scores"""
+    if not len(price) or limit <= 0:
+        return np.empty(0, dtype=np.intp), []
+    low = customer.get("budget_min") or 0
+    high = customer.get("budget_max") or np.inf
+    # 1 inside the budget, falling linearly to 0 at the stretched edges
+    budget = np.ones(len(price))
+    if low > 0:
+        budget -= np.maximum(low - price, 0) / (low * BUDGET_STRETCH)
+    if np.isfinite(high):
+        budget -= np.maximum(price - high, 0) / max(high * BUDGET_STRETCH, 1)
+    score = WEIGHTS["budget"] * np.clip(budget, 0, 1)
+    if city_code >= 0:
+        score += WEIGHTS["city"] * (city == city_code)
+    else:
+        score += WEIGHTS["city"]
+    best_value = area_per_dollar.max()
+    if best_value > 0:
+        score += (WEIGHTS["value"] / best_value) * area_per_dollar
+
+    top = np.arange(len(score))
+    if len(score) > limit:
+        # Only candidates within the value weight of the best can make the cut,
+        # unless fewer than ``limit`` do; partition just those
+        pool = np.flatnonzero(score >= score.max() - WEIGHTS["value"])
+        if len(pool) < limit:
+            pool = top
+        top = pool[np.argpartition(score[pool], len(pool) - limit)[len(pool) - limit:]] if len(pool) > limit else pool
+    top = top[np.argsort(-score[top], kind="stable")]
+    return top, [round(float(value), 4) for value in score[top]]
+
+
+async def match_all_customers(db, snapshot: PropertySnapshot, limit: int = DEFAULT_LIMIT,
+                              batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Batch job: rank matches for every customer with a budget into
+    ``customer_matches``. Callers hold the ``RUN_LEASE`` lease, since the
+    final sweep deletes results older than this run, including ones a
+    concurrent run just wrote.
+    """
+    started = datetime.utcnow()
+    matched = 0
+    frozen = snapshot.freeze()
+    query = {"$or": [{"budget_min": {"$gt": 0}}, {"budget_max": {"$gt": 0}}]}
+    cursor = db.customers.find(query, CUSTOMER_FIELDS, batch_size=batch_size)
+    while True:
+        customers = await cursor.to_list(batch_size)
+        if not customers:
+            break
+        results = await asyncio.to_thread(frozen.match_many, customers, limit)
+        await db[MATCHES].bulk_write([
+            ReplaceOne({"_id": customer["_id"]}, {
+                "matches": [{"property_id": property_id, "score": score} for property_id, score in matches],
+                "limit": limit,
+                "computed_at": started,
+            }, upsert=True)
+            for customer, matches in zip(customers, results)
+        ], ordered=False)
+        matched += len(customers)
+    # Customers that lost their budget since the last run
+    removed = await db[MATCHES].delete_many({"computed_at": {"$lt": started}})
+    return {"customers": matched, "removed": removed.deleted_count, "listings": len(frozen), "started_at": started}
+
+
+async def stored_matches(db, customer: Dict[str, Any], limit: int = DEFAULT_LIMIT) -> Optional[List[Match]]:
+    """
+    The customer's ranking from the last batch run, or None when there is
+    none, the customer changed since, or it was cut shorter than ``limit``.
+    Listings that changed since may be ranked on stale values.
+    """
+    stored = await db[MATCHES].find_one({"_id": customer["_id"]})
+    if stored is None:
+        return None
+    updated_at = customer.get("updated_at")
+    if isinstance(updated_at, datetime) and updated_at > stored["computed_at"]:
+        return None
+    matches = stored["matches"]
+    # A run ranks at most its own limit; fewer than that means there were no more candidates
+    if limit > len(matches) and len(matches) >= stored.get("limit", len(matches)):
+        return None
+    return [(match["property_id"], match["score"]) for match in matches[:limit]]
+
+
+async def _main(args) -> None:
+    import time
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    db = client[args.database]
+    lease = await claim(db, RUN_LEASE)
+    if lease is None:
+        client.close()
+        raise SystemExit("A matching run is already in progress")
+    try:
+        snapshot = PropertySnapshot()
+        began = time.perf_counter()
+        await snapshot.rebuild(db.properties)
+        print(f"Loaded {len(snapshot):,} available properties in {time.perf_counter() - began:.1f}s")
+        began = time.perf_counter()
+        report = await match_all_customers(db, snapshot, args.limit)
+        print(f"Matched {report['customers']:,} customers in {time.perf_counter() - began:.1f}s")
+    finally:
+        await lease.release()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank property matches for every customer with a budget")
+    parser.add_argument("--database", default=os.getenv("MONGODB_DATABASE", "real_estate_erp"))
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    asyncio.run(_main(parser.parse_args()))
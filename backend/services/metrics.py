@@ -0,0 +1,314 @@
+"""
+Request and MongoDB instrumentation, exposed in Prometheus text format.
+
+``MetricsMiddleware`` (plain ASGI, so streaming responses pass through
+untouched) records per-route latency and response-size histograms and
+the number of requests in flight. ``MongoCommandListener`` is registered
+on the Motor client. It times every command, attributes it to the
+request that issued it and logs slow ones with their filter shape
+(values replaced by ``"?"``).
+
+Motor runs commands on a thread pool but copies the caller's context,
+so the per-request ``RequestStats`` in a context variable is visible to
+the listener. When profiling is allowed, sending ``X-Profile: 1``
+returns the breakdown of one request as a ``Server-Timing`` header.
+
+Metrics are per worker process; scrape each worker or aggregate them.
+"""
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAX_PROFILED_COMMANDS = 20
+# Handshake and session housekeeping, not queries
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "endSessions", "ping", "buildInfo"}
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_label_text(self.labels, labels)} {value}" for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                bucket_labels = _label_text(self.labels, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[Any, Labels, float]]]] = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[Tuple[Any, Labels, float]]]) -> None:
+        """``collect`` yields (metric, labels, value) for values sampled at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self.lock:
+            for collect in self._collectors:
+                for metric, labels, value in collect():
+                    metric.values[labels] = value
+            lines = []
+            for metric in self._metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests handled", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to the last response byte", LATENCY_BUCKETS, ("method", "route")))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", SIZE_BUCKETS, ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests being handled right now"))
+http_mongo_commands = registry.register(Histogram(
+    "http_request_mongo_commands", "MongoDB commands issued per request", COUNT_BUCKETS, ("method", "route")))
+mongo_duration = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round trip", LATENCY_BUCKETS, ("command", "collection")))
+mongo_failures = registry.register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed", ("command", "collection")))
+mongo_slow = registry.register(Counter(
+    "mongo_slow_commands_total", "MongoDB commands slower than the slow-query threshold", ("command", "collection")))
+
+
+class RequestStats:
+    def __init__(self, profile: bool = False):
+        self.started = time.perf_counter()
+        self.profile = profile
+        self.mongo_count = 0
+        self.mongo_seconds = 0.0
+        self.sections: Dict[str, float] = {}
+        self.commands: List[Tuple[str, str, float]] = []
+        self._lock = threading.Lock()
+
+    def add_command(self, command: str, collection: str, seconds: float) -> None:
+        with self._lock:
+            self.mongo_count += 1
+            self.mongo_seconds += seconds
+            if self.profile and len(self.commands) < MAX_PROFILED_COMMANDS:
+                self.commands.append((command, collection, seconds))
+
+    def add_section(self, name: str, seconds: float) -> None:
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        accounted = self.mongo_seconds + sum(self.sections.values())
+        entries = [
+            f"total;dur={total * 1000:.2f}",
+            f'mongo;dur={self.mongo_seconds * 1000:.2f};desc="{self.mongo_count} commands"',
+            *(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.sections.items()),
+            f'app;dur={max(total - accounted, 0) * 1000:.2f};desc="routing, validation, handler"',
+        ]
+        entries += [
+            f'db{i};dur={seconds * 1000:.2f};desc="{command} {collection}"'
+            for i, (command, collection, seconds) in enumerate(self.commands, 1)
+        ]
+        return ", ".join(entries)
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+
+class timed_section:
+    """Attribute the enclosed block to ``name`` in the current request's profile"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stats = current_request.get()
+        if stats is not None:
+            stats.add_section(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def filter_shape(value: Any) -> Any:
+    """Keep the keys and operators of a filter, hide the values"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [filter_shape(item) for item in value[:3]] if value and isinstance(value[0], dict) else "?"
+    return "?"
+
+
+def _command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name == "aggregate":
+        return [stage for stage in command.get("pipeline", [])[:1]]
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        return statements[0].get("q") if statements else None
+    return None
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, slow_ms: float):
+        self.slow_ms = slow_ms
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Any]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        if event.command_name in IGNORED_COMMANDS or not isinstance(collection, str):
+            return
+        # The shape is only worked out for commands that turn out slow
+        self._pending[(event.connection_id, event.request_id)] = (
+            collection, _command_filter(event.command_name, event.command)
+        )
+
+    def _finish(self, event, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, command_filter = pending
+        seconds = event.duration_micros / 1_000_000
+        labels = (event.command_name, collection)
+        with registry.lock:
+            mongo_duration.observe(labels, seconds)
+            if failed:
+                mongo_failures.inc(labels)
+            if seconds * 1000 >= self.slow_ms:
+                mongo_slow.inc(labels)
+        if seconds * 1000 >= self.slow_ms:
+            logger.warning("Slow MongoDB %s on %s: %.1f ms, filter %s",
+                           event.command_name, collection, seconds * 1000, filter_shape(command_filter))
+        stats = current_request.get()
+        if stats is not None:
+            stats.add_command(event.command_name, collection, seconds)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+
+class MetricsMiddleware:
+    def __init__(self, app, allow_profiling: bool = False):
+        self.app = app
+        self.allow_profiling = allow_profiling
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            path = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+                        "unmatched")
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.allow_profiling and (b"x-profile", b"1") in scope.get("headers", ())
+        stats = RequestStats(profile)
+        token = current_request.set(stats)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile:
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"server-timing", stats.server_timing().encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        with registry.lock:
+            http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            route = self._route(scope)
+            labels = (scope["method"], route)
+            with registry.lock:
+                http_in_flight.inc(amount=-1)
+                http_requests.inc((scope["method"], route, str(status_code)))
+                http_duration.observe(labels, time.perf_counter() - stats.started)
+                http_response_size.observe(labels, size)
+                http_mongo_commands.observe(labels, stats.mongo_count)
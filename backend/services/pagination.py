@@ -0,0 +1,102 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``skip``, each page resumes strictly after the sort key of the
+last document returned, so fetching page N costs the same as page 1 when
+the sort key is indexed. ``_id`` is always the final tie-breaker, which
+keeps the ordering total even when the sort field has duplicates.
+
+Cursors are opaque to clients: a urlsafe base64 of the extended-JSON
+encoded sort spec and resume values.
+"""
+import base64
+import binascii
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import json_util
+
+SortSpec = List[Tuple[str, int]]
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for malformed cursors or unsupported sort fields"""
+
+
+def parse_sort(sort: Optional[str], allowed: Iterable[str]) -> SortSpec:
+    """Turn ``"price"`` / ``"-price"`` into a sort spec ending in ``_id``"""
+    if not sort:
+        return [("_id", 1)]
+    direction = -1 if sort.startswith("-") else 1
+    field = sort.lstrip("+-")
+    if field == "_id":
+        return [("_id", direction)]
+    if field not in allowed:
+        raise InvalidPageRequest(f"Cannot sort by '{field}'")
+    return [(field, direction), ("_id", direction)]
+
+
+def encode_token(payload: Dict[str, Any]) -> str:
+    """Pack an extended-JSON payload into an opaque urlsafe string"""
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidPageRequest("Malformed cursor")
+    if not isinstance(payload, dict):
+        raise InvalidPageRequest("Malformed cursor")
+    return payload
+
+
+def encode_cursor(sort_spec: SortSpec, doc: Dict[str, Any]) -> str:
+    return encode_token({"s": sort_spec, "v": [doc.get(field) for field, _ in sort_spec]})
+
+
+def decode_cursor(cursor: str, sort_spec: SortSpec) -> List[Any]:
+    payload = decode_token(cursor)
+    try:
+        values = payload["v"]
+        spec = [tuple(key) for key in payload["s"]]
+    except (KeyError, TypeError):
+        raise InvalidPageRequest("Malformed cursor")
+    if spec != sort_spec or len(values) != len(sort_spec):
+        raise InvalidPageRequest("Cursor does not match the requested sort order")
+    return values
+
+
+def keyset_filter(sort_spec: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """Match documents ordered strictly after ``values`` under ``sort_spec``"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort_spec):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort_spec[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def fetch_page(collection, query: Dict[str, Any], sort_spec: SortSpec, limit: int,
+                     cursor: Optional[str] = None, projection: Optional[Dict[str, Any]] = None
+                     ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of documents and the cursor for the next page (None on the last page)"""
+    if cursor:
+        after = keyset_filter(sort_spec, decode_cursor(cursor, sort_spec))
+        query = {"$and": [query, after]} if query else after
+    added = []
+    if projection is not None:
+        # The cursor is built from the sort keys, so they must be read too
+        added = [field for field, _ in sort_spec if field != "_id" and field not in projection]
+        projection = {**projection, **{field: 1 for field in added}}
+    limit = max(limit, 1)
+    # One extra document tells us whether another page exists
+    docs = await collection.find(query, projection).sort(sort_spec).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_spec, docs[-1])
+    for doc in docs:
+        for field in added:
+            doc.pop(field, None)
+    return docs, next_cursor
@@ -0,0 +1,49 @@
+"""
+Sparse fieldsets.
+
+``fields=title,price,status`` on a list or detail endpoint becomes a
+MongoDB projection, so unrequested fields are neither read off disk nor
+sent over the wire. Entries can also name a preset (``summary``,
+``card``) and mix presets with single fields. ``id`` is always returned.
+"""
+from typing import Any, Dict, Iterable, Optional
+
+Projection = Dict[str, Any]
+
+
+class InvalidProjection(ValueError):
+    """Raised for unknown field or preset names"""
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], presets: Dict[str, Projection]) -> Optional[Projection]:
+    """Turn ``"card,description"`` into a projection; None means whole documents"""
+    if not fields:
+        return None
+    allowed = set(allowed)
+    projection: Projection = {}
+    for name in (part.strip() for part in fields.split(",")):
+        if not name or name == "id":
+            continue
+        if name in presets:
+            projection.update(presets[name])
+        elif name in allowed:
+            projection[name] = 1
+        else:
+            raise InvalidProjection(f"Unknown field '{name}'")
+    return projection or {"_id": 1}
+
+
+def project(doc: Dict[str, Any], projection: Optional[Projection]) -> Dict[str, Any]:
+    """Apply a projection in memory, for documents served from a cache"""
+    if projection is None:
+        return doc
+    projected = {"_id": doc["_id"]} if "_id" in doc else {}
+    for field, spec in projection.items():
+        if field not in doc:
+            continue
+        value = doc[field]
+        if isinstance(spec, dict) and "$slice" in spec and isinstance(value, list):
+            count = spec["$slice"]
+            value = value[:count] if count >= 0 else value[count:]
+        projected[field] = value
+    return projected
@@ -0,0 +1,131 @@
+"""
+Ranked full-text property search.
+
+Two interchangeable backends answer the same query (free text plus the
+structured filter built by ``build_property_query``):
+
+* ``mongo``: a weighted MongoDB text index, ranked by ``textScore``.
+* ``memory``: an in-process inverted index with the same field weights,
+  maintained on property writes. Ranking and filtering happen in memory
+  and only the requested page is fetched from MongoDB by ``_id``.
+
+The in-memory index belongs to a single worker process. Writes handled
+by other workers only show up after the next periodic rebuild.
+"""
+import math
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+from services.changes import Change
+from services.city_search import normalize_city as fold_text  # casefold + strip accents
+
+TEXT_WEIGHTS = {"title": 10, "amenities": 5, "address": 3, "description": 1}
+# Fields kept next to the postings so structured filters run in memory
+FILTER_FIELDS = ("property_type", "status", "price", "city_normalized")
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [token for item in value for token in tokenize(item)]
+    if not isinstance(value, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(fold_text(value)) if token not in STOPWORDS]
+
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for operator, operand in condition.items():
+        if operator == "$gte" and not (value is not None and value >= operand):
+            return False
+        if operator == "$lte" and not (value is not None and value <= operand):
+            return False
+        if operator == "$regex" and not (isinstance(value, str) and re.match(operand, value)):
+            return False
+    return True
+
+
+def matches_filter(attrs: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate the subset of query operators build_property_query emits"""
+    return all(_matches_condition(attrs.get(field), condition) for field, condition in query.items())
+
+
+async def mongo_text_search(collection, text: str, query: Dict[str, Any], skip: int, limit: int) -> List[Dict[str, Any]]:
+    score = {"$meta": "textScore"}
+    return await collection.find(
+        {"$text": {"$search": text}, **query},
+        {"score": score},
+    ).sort([("score", score)]).skip(skip).limit(limit).to_list(limit)
+
+
+class InvertedIndex:
+    def __init__(self):
+        self._postings: Dict[str, Dict[Any, float]] = {}
+        self._doc_terms: Dict[Any, Tuple[str, ...]] = {}
+        self._attrs: Dict[Any, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        doc_id = doc["_id"]
+        self.remove(doc_id)
+        weights: Dict[str, float] = {}
+        for field, weight in TEXT_WEIGHTS.items():
+            for token in tokenize(doc.get(field)):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[doc_id] = weight
+        self._doc_terms[doc_id] = tuple(weights)
+        self._attrs[doc_id] = {field: doc.get(field) for field in FILTER_FIELDS}
+
+    def remove(self, doc_id: Any) -> None:
+        for token in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._attrs.pop(doc_id, None)
+
+    def search(self, text: str, query: Dict[str, Any]) -> List[Tuple[Any, float]]:
+        """All matching ids with their scores, best first"""
+        total = len(self._doc_terms) or 1
+        scores: Dict[Any, float] = {}
+        for token in set(tokenize(text)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for doc_id, weight in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0) + weight * idf
+        if query:
+            scores = {doc_id: score for doc_id, score in scores.items() if matches_filter(self._attrs[doc_id], query)}
+        return sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+
+    async def rebuild(self, collection) -> None:
+        fresh = InvertedIndex()
+        projection = {field: 1 for field in (*TEXT_WEIGHTS, *FILTER_FIELDS)}
+        async for doc in collection.find({}, projection, batch_size=1000):
+            fresh.add(doc)
+        self._postings, self._doc_terms, self._attrs = fresh._postings, fresh._doc_terms, fresh._attrs
+
+    def apply_changes(self, changes: Iterable[Change]) -> None:
+        """Apply a batch of writes (see ``services.changes``)"""
+        for before, after in changes:
+            if after is None:
+                self.remove(before["_id"])
+            else:
+                self.add({**(before or {}), **after})
+
+
+async def memory_search(index: InvertedIndex, collection, text: str, query: Dict[str, Any],
+                        skip: int, limit: int) -> List[Dict[str, Any]]:
+    ranked = index.search(text, query)[skip:skip + limit]
+    if not ranked:
+        return []
+    docs = await collection.find({"_id": {"$in": [doc_id for doc_id, _ in ranked]}}).to_list(len(ranked))
+    by_id = {doc["_id"]: doc for doc in docs}
+    return [{**by_id[doc_id], "score": score} for doc_id, score in ranked if doc_id in by_id]
@@ -0,0 +1,43 @@
+"""
+Swap-in rebuilds of derived collections.
+
+``replace_collection`` writes a fresh copy of a collection into a scratch
+collection of the run's own, gives it the registry's indexes and renames
+it over the live one, so readers see the old contents until the new ones
+are complete. Concurrent rebuilds never share a scratch collection, and
+one that fails leaves nothing behind.
+"""
+from typing import Any, AsyncIterable, Dict, List
+
+from bson import ObjectId
+
+from services.indexes import INDEXES
+
+WRITE_BATCH_SIZE = 5_000
+
+
+async def replace_collection(db, name: str, docs: AsyncIterable[Dict[str, Any]]) -> int:
+    """Replace the contents of ``name`` with ``docs``; returns how many were written"""
+    scratch = db[f"{name}_rebuild_{ObjectId()}"]
+    try:
+        written = 0
+        batch: List[Dict[str, Any]] = []
+        async for doc in docs:
+            batch.append(doc)
+            if len(batch) >= WRITE_BATCH_SIZE:
+                await scratch.insert_many(batch, ordered=False)
+                written, batch = written + len(batch), []
+        if batch:
+            await scratch.insert_many(batch, ordered=False)
+            written += len(batch)
+
+        if written:
+            # Renaming over the live collection drops its indexes along with it
+            await scratch.create_indexes(INDEXES[name])
+            await scratch.rename(name, dropTarget=True)
+        else:
+            await db[name].delete_many({})
+        return written
+    finally:
+        # A no-op once renamed; clears what a failed run left behind
+        await scratch.drop()
@@ -0,0 +1,56 @@
+"""
+Fast-path JSON rendering for MongoDB documents.
+
+Documents are encoded straight to bytes by orjson, which handles
+datetime, date and Enum natively; a ``default`` hook covers the BSON-only
+types. Handlers return ``JSONBytesResponse`` directly, so FastAPI skips
+``response_model`` validation and ``jsonable_encoder`` (the model only
+documents the shape in OpenAPI).
+"""
+from typing import Any, Dict, List, Optional
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi import Response
+
+from services.metrics import timed_section
+
+
+def bson_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def api_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Expose ``_id`` as a string ``id`` (in place, the document is ours)"""
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with timed_section("serialize"):
+            return dumps(content)
+
+
+def document_response(doc: Dict[str, Any]) -> JSONBytesResponse:
+    return JSONBytesResponse(api_doc(doc))
+
+
+def documents_response(docs: List[Dict[str, Any]]) -> JSONBytesResponse:
+    return JSONBytesResponse([api_doc(doc) for doc in docs])
+
+
+def page_response(docs: List[Dict[str, Any]], next_cursor: Optional[str]) -> JSONBytesResponse:
+    """CursorPage envelope"""
+    return JSONBytesResponse({"items": [api_doc(doc) for doc in docs], "next_cursor": next_cursor})
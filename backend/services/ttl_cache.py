@@ -0,0 +1,92 @@
+"""
+In-process async cache with per-entry TTL and stampede protection.
+
+Concurrent misses for the same key share a single load: the first caller
+starts the loader and everyone else awaits the same task. A write
+(``set`` or ``invalidate``) while a load is in flight keeps that load's
+result out of the cache, so it cannot overwrite fresher data. With
+``maxsize`` the least recently used entries are evicted beyond that many.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class AsyncTTLCache:
+    def __init__(self, ttl: float, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._values: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # Loads overtaken by a write; their result must not be stored
+        self._stale: Set[asyncio.Task] = set()
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """The cached value, else ``loader()``'s result; None results are not cached"""
+        entry = self._values.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._values.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            del self._values[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["misses"] += 1
+            task = asyncio.ensure_future(self._load(key, loader))
+            # Retrieve the exception even if every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.counters["coalesced"] += 1
+        # Shield so a disconnecting client does not cancel the load for others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            if value is not None and task not in self._stale:
+                self._store(key, value)
+            return value
+        finally:
+            self._stale.discard(task)
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._values[key] = (time.monotonic() + self.ttl, value)
+        self._values.move_to_end(key)
+        while self.maxsize is not None and len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _supersede(self, key: Hashable) -> None:
+        task = self._inflight.pop(key, None)
+        if task is not None:
+            self._stale.add(task)
+
+    def is_current(self, key: Hashable) -> bool:
+        """Called from a loader: False once a write has superseded its load"""
+        return self._inflight.get(key) is asyncio.current_task()
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value that was just written, superseding any load in flight"""
+        self._supersede(key)
+        self._store(key, value)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop ``key``, or everything, including loads in flight"""
+        if key is None:
+            self._values.clear()
+            for inflight in list(self._inflight):
+                self._supersede(inflight)
+        else:
+            self._values.pop(key, None)
+            self._supersede(key)
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# Modules import each other as ``services.*``, relative to backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test"]
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.agent_metrics import (
+    METRICS, InvalidLeaderboard, leaderboard, rebuild_metrics, record_finance_changes, record_lease_changes,
+    record_sale_changes,
+)
+
+NOW = datetime(2024, 5, 20)
+
+
+def nonzero(value):
+    """Metrics as a rebuild writes them: increments leave zeros behind where a rebuild has no key"""
+    if isinstance(value, dict):
+        return {key: nonzero(item) for key, item in value.items() if nonzero(item) not in (0, {})}
+    return value
+
+
+async def metrics(db):
+    docs = {doc["_id"]: nonzero(doc) async for doc in db[METRICS].find()}
+    return {doc_id: doc for doc_id, doc in docs.items() if set(doc) - {"_id", "agent_id", "period"}}
+
+
+async def write(db, collection, record, before=None, after=None):
+    """Apply one write to the source collection and report it the way main.py does"""
+    if after is None:
+        await db[collection].delete_one({"_id": before["_id"]})
+    elif before is None:
+        await db[collection].insert_one(dict(after))
+    else:
+        await db[collection].update_one({"_id": before["_id"]}, {"$set": after})
+    await record(db, [(before, after)])
+
+
+@pytest.mark.asyncio
+async def test_increments_match_a_rebuild(db):
+    sale = {"_id": ObjectId(), "agent_id": "a1", "status": "pending", "sale_price": 500, "commission_amount": 15,
+            "closing_date": datetime(2024, 4, 30)}
+    other = {"_id": ObjectId(), "agent_id": "a2", "status": "closed", "sale_price": 200, "commission_amount": 6,
+             "closing_date": datetime(2023, 12, 1)}
+    lease = {"_id": ObjectId(), "agent_id": "a2", "monthly_rent": 1200, "lease_start": datetime(2024, 5, 1)}
+    income = {"_id": ObjectId(), "agent_id": "a1", "type": "income", "category": "commission", "amount": 15,
+              "date": datetime(2024, 5, 2)}
+    await write(db, "sales", record_sale_changes, after=sale)
+    await write(db, "sales", record_sale_changes, after=other)
+    await write(db, "leases", record_lease_changes, after=lease)
+    await write(db, "finance_records", record_finance_changes, after=income)
+    # Closing moves the sale to another month; the other sale is reassigned, then deleted
+    await write(db, "sales", record_sale_changes, sale, {"status": "closed", "closing_date": datetime(2024, 5, 3)})
+    await write(db, "sales", record_sale_changes, other, {"agent_id": "a3"})
+    await write(db, "sales", record_sale_changes, {**other, "agent_id": "a3"})
+    await write(db, "finance_records", record_finance_changes, income, {"category": "fees"})
+    incremental = await metrics(db)
+
+    await rebuild_metrics(db)
+    assert await metrics(db) == incremental
+    assert incremental["a1|2024-05"] == {"_id": "a1|2024-05", "agent_id": "a1", "period": "2024-05",
+                                         "sales_count": 1, "sales_volume": 500, "commission": 15,
+                                         "stages": {"closed": 1}}
+    assert "a1|2024-04" not in incremental and "a3|all" not in incremental
+
+
+@pytest.mark.asyncio
+async def test_rebuild_of_nothing_empties_the_collection(db):
+    await db[METRICS].insert_one({"_id": "a1|all", "agent_id": "a1", "period": "all", "sales_count": 3})
+    assert await rebuild_metrics(db) == 0
+    assert await db[METRICS].count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_ranks_within_a_period(db):
+    sales = [
+        {"_id": ObjectId(), "agent_id": agent, "status": "closed", "sale_price": price, "commission_amount": 0,
+         "closing_date": when}
+        for agent, price, when in [("a1", 100, datetime(2024, 5, 1)), ("a2", 300, datetime(2024, 5, 2)),
+                                   ("a3", 300, datetime(2024, 5, 3)), ("a1", 900, datetime(2024, 4, 1))]
+    ]
+    await record_sale_changes(db, [(None, sale) for sale in sales])
+
+    board = await leaderboard(db, "this_month", now=NOW)
+    assert board["period"] == "2024-05"
+    assert [(agent["rank"], agent["agent_id"], agent["sales_volume"]) for agent in board["agents"]] == [
+        (1, "a2", 300), (2, "a3", 300), (3, "a1", 100)]
+    assert [agent["agent_id"] for agent in (await leaderboard(db, "all", limit=1))["agents"]] == ["a1"]
+    # Nobody has commission to rank by
+    assert (await leaderboard(db, "2024", "commission"))["agents"] == []
+    with pytest.raises(InvalidLeaderboard):
+        await leaderboard(db, "2024", "price")
+    with pytest.raises(InvalidLeaderboard):
+        await leaderboard(db, "someday")
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from jose import jwt
+
+from services.auth import InvalidToken, TokenCache, decode_token
+
+SECRET = "test-secret"
+
+
+def token(**claims):
+    return jwt.encode({"sub": "admin", "exp": int(time.time()) + 600, **claims}, SECRET, algorithm="HS256")
+
+
+def test_valid_tokens_are_decoded_once():
+    cache = TokenCache(maxsize=10, ttl=300)
+    access = token(type="access")
+    assert decode_token(access, SECRET, "HS256", cache)["sub"] == "admin"
+    assert decode_token(access, SECRET, "HS256", cache)["sub"] == "admin"
+    assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 1
+
+
+def test_token_type_is_checked_on_cache_hits():
+    cache = TokenCache(maxsize=10, ttl=300)
+    refresh = token(type="refresh")
+    assert decode_token(refresh, SECRET, "HS256", cache, token_type="refresh")["type"] == "refresh"
+    with pytest.raises(InvalidToken, match="access"):
+        decode_token(refresh, SECRET, "HS256", cache)
+    assert cache.stats()["hits"] == 1
+    # Issued before token types existed
+    assert decode_token(token(), SECRET, "HS256", cache)["sub"] == "admin"
+
+
+@pytest.mark.parametrize("bad", [
+    "not-a-jwt",
+    jwt.encode({"sub": "admin"}, "another-secret", algorithm="HS256"),
+    jwt.encode({"sub": "admin", "exp": int(time.time()) - 10}, SECRET, algorithm="HS256"),
+    jwt.encode({"role": "admin"}, SECRET, algorithm="HS256"),
+])
+def test_rejected_tokens_are_not_cached(bad):
+    cache = TokenCache(maxsize=10, ttl=300)
+    with pytest.raises(InvalidToken):
+        decode_token(bad, SECRET, "HS256", cache)
+    assert cache.stats()["size"] == 0
+
+
+def test_entries_expire_with_the_token_and_are_evicted_lru():
+    cache = TokenCache(maxsize=2, ttl=300)
+    cache.put("expired", {"sub": "a", "exp": time.time() - 1})
+    assert cache.get("expired") is None
+
+    cache.put("a", {"sub": "a"})
+    cache.put("b", {"sub": "b"})
+    cache.get("a")
+    cache.put("c", {"sub": "c"})
+    assert cache.get("b") is None and cache.get("a") == {"sub": "a"}
+    assert cache.stats()["evictions"] == 1
+
+    cache.discard("a")
+    assert cache.get("a") is None
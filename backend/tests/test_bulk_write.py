@@ -0,0 +1,85 @@
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from services.bulk_write import bulk_write_documents
+
+
+@pytest.fixture
+def collection():
+    return AsyncMongoMockClient()["test"]["customers"]
+
+
+@pytest.mark.asyncio
+async def test_inserts_report_their_request_index_and_id(collection):
+    results, changes = await bulk_write_documents(collection, [(4, {"name": "a"}), (9, {"name": "b"})])
+    assert [(r["index"], r["status"]) for r in results] == [(4, "created"), (9, "created")]
+    stored = {str(doc["_id"]): doc["name"] async for doc in collection.find()}
+    assert {r["id"]: stored[r["id"]] for r in results} == {results[0]["id"]: "a", results[1]["id"]: "b"}
+    assert [before for before, _ in changes] == [None, None]
+    assert [after["version"] for _, after in changes] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_upserts_update_by_key_and_keep_the_existing_id(collection):
+    existing = {"_id": ObjectId(), "email": "a@x.io", "name": "old", "version": 2, "created_at": 1}
+    await collection.insert_one(existing)
+    items = [(0, {"email": "a@x.io", "name": "new", "created_at": 5}), (1, {"email": "b@x.io", "name": "b"})]
+    results, changes = await bulk_write_documents(collection, items, upsert_key="email")
+
+    assert results[0] == {"index": 0, "status": "updated", "id": str(existing["_id"])}
+    assert results[1]["status"] == "created"
+    assert (await collection.find_one({"email": "b@x.io"}))["version"] == 0
+    updated = await collection.find_one({"email": "a@x.io"})
+    assert (updated["name"], updated["version"], updated["created_at"]) == ("new", 3, 1)
+    assert changes[0][0] == existing and changes[0][1]["version"] == 3
+
+
+@pytest.mark.asyncio
+async def test_repeated_key_updates_what_the_earlier_item_wrote(collection):
+    items = [(0, {"email": "a@x.io", "name": "first"}), (1, {"email": "a@x.io", "name": "second"})]
+    results, changes = await bulk_write_documents(collection, items, upsert_key="email")
+    assert [r["status"] for r in results] == ["created", "updated"]
+    assert results[0]["id"] == results[1]["id"]
+    assert changes[1][0]["name"] == "first"
+    assert (await collection.find_one({"email": "a@x.io"}))["version"] == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_map_back_to_request_indexes(collection):
+    await collection.create_index("email", unique=True)
+    await collection.insert_one({"email": "taken@x.io"})
+    items = [(0, {"email": "new@x.io"}), (1, {"email": "taken@x.io"}), (2, {"email": "late@x.io"})]
+
+    results, changes = await bulk_write_documents(collection, items, ordered=True)
+    assert [(r["index"], r["status"]) for r in results] == [(0, "created"), (1, "failed"), (2, "skipped")]
+    assert len(changes) == 1
+
+    results, changes = await bulk_write_documents(collection, [(i, {"email": e}) for i, e in
+                                                               ((5, "taken@x.io"), (6, "other@x.io"))])
+    assert [(r["index"], r["status"]) for r in results] == [(5, "failed"), (6, "created")]
+    assert [after["email"] for _, after in changes] == ["other@x.io"]
+
+
+class StalePrefetch:
+    """A collection whose prefetch misses a document another writer just created"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return self.collection.find({"_id": None})
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+@pytest.mark.asyncio
+async def test_key_created_concurrently_fails_instead_of_counting_twice(collection):
+    await collection.create_index("email", unique=True, partialFilterExpression={"email": {"$type": "string"}})
+    await collection.insert_one({"email": "a@x.io", "name": "theirs", "version": 1})
+    results, changes = await bulk_write_documents(StalePrefetch(collection), [(0, {"email": "a@x.io", "name": "ours"})],
+                                                  upsert_key="email")
+    assert results[0]["status"] == "failed"
+    assert changes == []
+    assert (await collection.find_one({"email": "a@x.io"}))["name"] == "theirs"
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from starlette.requests import Request
+
+from services.conditional import _http_date, document_validators, is_not_modified, make_etag
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 250000)
+
+
+def request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_no_validators_means_modified():
+    assert not is_not_modified(request(), make_etag(1), UPDATED_AT)
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = make_etag("abc", 3)
+    assert is_not_modified(request(if_none_match=etag), etag, None)
+    assert is_not_modified(request(if_none_match=etag[2:]), etag, None)
+    assert is_not_modified(request(if_none_match=f'W/"other", {etag}'), etag, None)
+    assert is_not_modified(request(if_none_match="*"), etag, None)
+    assert not is_not_modified(request(if_none_match='W/"other"'), etag, None)
+
+
+def test_if_none_match_takes_precedence():
+    headers = {"if_none_match": 'W/"other"', "if_modified_since": _http_date(UPDATED_AT)}
+    assert not is_not_modified(request(**headers), make_etag(1), UPDATED_AT)
+
+
+def test_if_modified_since_ignores_subsecond_precision():
+    etag = make_etag(1)
+    assert is_not_modified(request(if_modified_since=_http_date(UPDATED_AT)), etag, UPDATED_AT)
+    assert not is_not_modified(request(if_modified_since="Wed, 01 May 2024 12:30:14 GMT"), etag, UPDATED_AT)
+    assert not is_not_modified(request(if_modified_since="yesterday"), etag, UPDATED_AT)
+    assert not is_not_modified(request(if_modified_since=_http_date(UPDATED_AT)), etag, None)
+
+
+def test_document_etag_changes_with_version_and_variant():
+    doc = {"_id": 1, "version": 2, "updated_at": UPDATED_AT}
+    etag, last_modified = document_validators(doc)
+    assert last_modified == UPDATED_AT
+    assert document_validators({**doc, "version": 3})[0] != etag
+    assert document_validators(doc, "title,price")[0] != etag
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.dashboard_counters import (
+    GLOBAL_ID, read_dashboard_counters, rebuild_counters, record_finance_changes, record_property_changes,
+    record_sale_changes,
+)
+
+NOW = datetime(2024, 5, 20)
+
+
+def nonzero(value):
+    """Counters as a rebuild writes them: increments leave zeros behind where a rebuild has no key"""
+    if isinstance(value, dict):
+        return {key: nonzero(item) for key, item in value.items() if nonzero(item) not in (0, {})}
+    return value
+
+
+async def counters(db):
+    doc = await db.dashboard_counters.find_one({"_id": GLOBAL_ID})
+    return nonzero({key: value for key, value in doc.items() if key not in ("_id", "reconciled_at")})
+
+
+async def write(db, collection, record, before=None, after=None):
+    """Apply one write to the source collection and report it the way main.py does"""
+    if after is None:
+        await db[collection].delete_one({"_id": before["_id"]})
+    elif before is None:
+        await db[collection].insert_one(after)
+    else:
+        await db[collection].update_one({"_id": before["_id"]}, {"$set": after})
+    await record(db, [(before, after)])
+
+
+@pytest.mark.asyncio
+async def test_increments_match_a_rebuild(db):
+    house = {"_id": ObjectId(), "status": "available", "property_type": "house", "price": 300}
+    flat = {"_id": ObjectId(), "status": "available", "property_type": "apartment", "price": 100}
+    await write(db, "properties", record_property_changes, after=house)
+    await write(db, "properties", record_property_changes, after=flat)
+    await write(db, "properties", record_property_changes, before=house, after={"status": "sold", "price": 320})
+    await write(db, "properties", record_property_changes, before=flat)
+
+    sale = {"_id": ObjectId(), "sale_price": 320, "closing_date": datetime(2024, 5, 2)}
+    await write(db, "sales", record_sale_changes, after=sale)
+    await write(db, "sales", record_sale_changes, before=sale, after={"closing_date": datetime(2024, 4, 30)})
+    await write(db, "finance_records", record_finance_changes,
+                after={"_id": ObjectId(), "type": "income", "amount": 50, "date": datetime(2024, 5, 3)})
+    await write(db, "finance_records", record_finance_changes,
+                after={"_id": ObjectId(), "type": "transfer", "amount": 7, "date": datetime(2024, 5, 3)})
+
+    incremental = await counters(db)
+    await rebuild_counters(db)
+    assert await counters(db) == incremental
+    assert incremental["properties"] == {"total": 1, "price_sum": 320, "by_status": {"sold": 1}, "by_type": {"house": 1}}
+    assert incremental["sales"]["by_month"] == {"2024-04": {"count": 1, "volume": 320}}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_corrects_drift(db):
+    await db.properties.insert_one({"status": "available", "property_type": "house", "price": 10})
+    await db.dashboard_counters.insert_one({"_id": GLOBAL_ID, "properties": {"total": 42}})
+    await db.dashboard_counters.insert_one({"_id": "agent|a1", "kind": "agent"})
+    await rebuild_counters(db)
+    assert (await counters(db))["properties"]["total"] == 1
+    assert await db.dashboard_counters.count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_read_waits_for_the_first_reconciliation(db):
+    await record_property_changes(db, [(None, {"status": "available", "property_type": "house", "price": 10})])
+    assert await read_dashboard_counters(db, ["house"], NOW) is None
+
+    await db.properties.insert_one({"status": "available", "property_type": "house", "price": 10})
+    await db.finance_records.insert_one({"type": "expense", "amount": 4, "date": datetime(2024, 5, 1)})
+    await rebuild_counters(db)
+    stats = await read_dashboard_counters(db, ["house", "villa"], NOW)
+    assert stats["available_properties"] == 1
+    assert stats["properties_by_type"] == {"house": 1, "villa": 0}
+    assert (stats["monthly_expenses"], stats["net_profit"]) == (4, -4)
+    assert stats["sales_by_month"][-1]["month"] == "2024-05"
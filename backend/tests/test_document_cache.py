@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from services.document_cache import DocumentCache, MemoryBackend
+
+
+class SlowCollection:
+    """Holds every find_one until ``release`` is set, counting the queries"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.release = asyncio.Event()
+        self.queries = 0
+
+    async def find_one(self, query):
+        self.queries += 1
+        await self.release.wait()
+        return await self.collection.find_one(query)
+
+
+@pytest.fixture
+def cache(db):
+    return DocumentCache(db.properties, maxsize=2, ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_reads_through_once_and_hands_out_copies(db, cache):
+    await db.properties.insert_one({"_id": 1, "title": "Loft"})
+    first = await cache.get(1)
+    first["title"] = "changed by the caller"
+    assert await cache.get(1) == {"_id": 1, "title": "Loft"}
+    assert await cache.get(2) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_writes_refresh_or_drop_the_cached_copy(db, cache):
+    await db.properties.insert_one({"_id": 1, "title": "Loft", "price": 10})
+    await cache.get(1)
+    await db.properties.update_one({"_id": 1}, {"$set": {"price": 12}})
+    await cache.apply_changes([({"_id": 1, "title": "Loft", "price": 10}, {"price": 12})])
+    assert (await cache.get(1))["price"] == 12
+
+    await db.properties.delete_one({"_id": 1})
+    await cache.apply_changes([({"_id": 1, "title": "Loft", "price": 12}, None)])
+    assert await cache.get(1) is None
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_is_evicted(cache):
+    for doc_id in (1, 2, 3):
+        await cache.put({"_id": doc_id})
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_query(db):
+    await db.properties.insert_one({"_id": 1, "title": "Loft"})
+    slow = SlowCollection(db.properties)
+    cache = DocumentCache(slow, maxsize=10, ttl=60)
+    readers = [asyncio.create_task(cache.get(1)) for _ in range(5)]
+    await asyncio.sleep(0)
+    slow.release.set()
+    assert [doc["title"] for doc in await asyncio.gather(*readers)] == ["Loft"] * 5
+    assert slow.queries == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_a_write_is_not_cached(db):
+    await db.properties.insert_one({"_id": 1, "title": "Old"})
+    shared = MemoryBackend()
+    slow = SlowCollection(db.properties)
+    cache = DocumentCache(slow, maxsize=10, ttl=60, shared=shared)
+    reader = asyncio.create_task(cache.get(1))
+    while not slow.queries:
+        await asyncio.sleep(0)
+
+    # The write lands while the read is still waiting on its query
+    await cache.put({"_id": 1, "title": "New"})
+    slow.release.set()
+    assert (await reader)["title"] == "Old"
+    assert (await cache.get(1))["title"] == "New"
+
+    other_worker = DocumentCache(db.properties, maxsize=10, ttl=60, shared=shared)
+    assert (await other_worker.get(1))["title"] == "New"
+    assert other_worker.stats()["shared_hits"] == 1
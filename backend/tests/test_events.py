@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from services import conditional
+from services.events import EventHub, feed_forever, format_event
+
+
+async def until(condition, timeout=1.0):
+    """Let background tasks run until ``condition()`` holds"""
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(wait(), timeout)
+
+
+class Standalone:
+    """A database without change streams, as on a single mongod"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_coalesced_per_subscriber():
+    hub = EventHub(debounce=0)
+    early = hub.subscribe()
+    hub.publish("sales", "insert")
+    late = hub.subscribe()
+    hub.publish("sales", "insert")
+    hub.publish("leases", "delete", count=3)
+
+    assert await hub.next_delta(early, 1) == {"sales": {"insert": 2}, "leases": {"delete": 3}}
+    assert await hub.next_delta(late, 1) == {"sales": {"insert": 1}, "leases": {"delete": 3}}
+    assert await hub.next_delta(early, 0.01) is None
+
+    hub.unsubscribe(late)
+    hub.publish("sales")
+    assert len(hub) == 1 and late.pending == {}
+
+
+@pytest.mark.asyncio
+async def test_standalone_server_falls_back_to_polling_markers(db):
+    hub = EventHub(debounce=0)
+    subscription = hub.subscribe()
+    feed = asyncio.create_task(feed_forever(Standalone(db), hub, ["properties", "sales"], poll_interval=0.01))
+    try:
+        await until(lambda: hub.mode == "polling")
+        await asyncio.sleep(0.02)  # the first poll records the starting markers
+        await conditional.touch(db, "properties")
+        await conditional.touch(db, "properties")
+        await conditional.touch(db, "customers")  # not watched
+        await until(lambda: subscription.pending)
+        assert await hub.next_delta(subscription, 1) == {"properties": {"change": 2}}
+    finally:
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+
+
+def test_format_event():
+    assert format_event("change", {"sales": {"insert": 1}}) == b'event: change\ndata: {"sales":{"insert":1}}\n\n'
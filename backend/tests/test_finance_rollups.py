@@ -0,0 +1,88 @@
+from datetime import date, datetime
+
+import pytest
+
+from services.finance_rollups import ROLLUPS, _grain_filters, rebuild_rollups, record_changes, summarize
+
+
+async def buckets(db):
+    return sorted(await db[ROLLUPS].find().to_list(None), key=repr)
+
+
+def span(grain, start=None, end=None):
+    period = {}
+    if start:
+        period["$gte"] = datetime(*start)
+    if end:
+        period["$lt"] = datetime(*end)
+    return {"grain": grain, "period": period} if period else {"grain": grain}
+
+
+def test_open_range_reads_months_only():
+    assert _grain_filters(None, None, None) == [span("month")]
+
+
+def test_whole_months_use_month_buckets():
+    assert _grain_filters(date(2024, 1, 1), date(2024, 3, 31), None) == [span("month", (2024, 1, 1), (2024, 4, 1))]
+
+
+def test_partial_months_at_both_ends_use_day_buckets():
+    assert _grain_filters(date(2024, 1, 15), date(2024, 4, 10), None) == [
+        span("month", (2024, 2, 1), (2024, 4, 1)),
+        span("day", (2024, 1, 15), (2024, 2, 1)),
+        span("day", (2024, 4, 1), (2024, 4, 11)),
+    ]
+
+
+def test_range_within_one_month_uses_days():
+    assert _grain_filters(date(2024, 2, 3), date(2024, 2, 20), None) == [span("day", (2024, 2, 3), (2024, 2, 21))]
+    assert _grain_filters(date(2024, 1, 15), date(2024, 2, 20), None) == [span("day", (2024, 1, 15), (2024, 2, 21))]
+
+
+def test_open_ends():
+    assert _grain_filters(date(2024, 1, 15), None, None) == [
+        span("month", (2024, 2, 1)),
+        span("day", (2024, 1, 15), (2024, 2, 1)),
+    ]
+    assert _grain_filters(None, date(2024, 3, 10), None) == [
+        span("month", None, (2024, 3, 1)),
+        span("day", (2024, 3, 1), (2024, 3, 11)),
+    ]
+
+
+def test_daily_periods_read_day_buckets():
+    assert _grain_filters(date(2024, 1, 1), date(2024, 3, 31), "day") == [span("day", (2024, 1, 1), (2024, 4, 1))]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_none_empty_and_missing_dimensions_apart(db):
+    records = [
+        {"type": "income", "category": "rent", "property_id": None, "amount": 1, "date": datetime(2024, 1, 5)},
+        {"type": "income", "category": "rent", "property_id": "", "amount": 2, "date": datetime(2024, 1, 5)},
+        {"type": "income", "category": "rent", "amount": 4, "date": datetime(2024, 1, 5)},
+        {"type": "income", "category": "rent", "property_id": "p1", "amount": 8, "date": datetime(2024, 1, 6)},
+    ]
+    await db.finance_records.insert_many([dict(record) for record in records])
+    await rebuild_rollups(db)
+    rebuilt = await buckets(db)
+
+    await db[ROLLUPS].drop()
+    await record_changes(db, [(None, record) for record in records])
+    assert await buckets(db) == rebuilt
+    assert sum(bucket["total"] for bucket in rebuilt if bucket["grain"] == "month") == 15
+
+
+@pytest.mark.asyncio
+async def test_increments_match_a_rebuild(db):
+    record = {"_id": 1, "type": "expense", "category": "repairs", "agent_id": "a1", "amount": 30,
+              "date": datetime(2024, 2, 29)}
+    await db.finance_records.insert_one(dict(record))
+    await record_changes(db, [(None, record)])
+    await db.finance_records.update_one({"_id": 1}, {"$set": {"amount": 35, "date": datetime(2024, 3, 1)}})
+    await record_changes(db, [(record, {"amount": 35, "date": datetime(2024, 3, 1)})])
+    incremental = [bucket for bucket in await buckets(db) if bucket["count"]]
+
+    await rebuild_rollups(db)
+    assert await buckets(db) == incremental
+    summary = await summarize(db, date(2024, 1, 1), date(2024, 3, 31), group_by=["category"])
+    assert summary["totals"] == {"income": 0, "expense": 35, "net": -35}
@@ -0,0 +1,109 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from services.geo_search import InvalidShape, nearest_page, parse_polygon, point
+from services.pagination import InvalidPageRequest
+
+NEAR = point(40.0, -3.7)
+
+
+class _Result:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class _Failing:
+    def __init__(self, error):
+        self.error = error
+
+    async def to_list(self, length):
+        raise self.error
+
+
+class GeoCollection:
+    """Plays back ``$geoNear`` over documents that carry their distance"""
+
+    def __init__(self, docs, error=None):
+        self.docs = docs
+        self.error = error
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        if self.error:
+            return _Failing(self.error)
+        geo_near, limit = pipeline[0]["$geoNear"], pipeline[1]["$limit"]
+        query = geo_near.get("query", {})
+        clauses = query.get("$and", [query])
+        excluded = [id_ for clause in clauses for id_ in clause.get("_id", {}).get("$nin", [])]
+        docs = [
+            doc for doc in sorted(self.docs, key=lambda doc: doc["distance_m"])
+            if doc["distance_m"] >= geo_near.get("minDistance", 0) and doc["_id"] not in excluded
+        ]
+        return _Result(docs[:limit])
+
+
+async def all_pages(collection, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        docs, cursor = await nearest_page(collection, NEAR, {}, limit, cursor)
+        seen += [doc["_id"] for doc in docs]
+        pages += 1
+        if cursor is None:
+            return seen, pages
+
+
+@pytest.mark.asyncio
+async def test_pages_resume_at_the_last_distance():
+    collection = GeoCollection([{"_id": i, "distance_m": d} for i, d in enumerate([0, 5, 10, 10, 20])])
+    docs, cursor = await nearest_page(collection, NEAR, {"status": "available"}, 3)
+    assert [doc["_id"] for doc in docs] == [0, 1, 2]
+    docs, cursor = await nearest_page(collection, NEAR, {"status": "available"}, 3, cursor)
+    assert [doc["_id"] for doc in docs] == [3, 4]
+    assert cursor is None
+    geo_near = collection.pipelines[-1][0]["$geoNear"]
+    assert geo_near["minDistance"] == 10
+    assert geo_near["query"] == {"$and": [{"status": "available"}, {"_id": {"$nin": [2]}}]}
+
+
+@pytest.mark.asyncio
+async def test_ties_wider_than_a_page_are_neither_repeated_nor_skipped():
+    distances = [1, 7, 7, 7, 7, 7, 9]
+    collection = GeoCollection([{"_id": i, "distance_m": d} for i, d in enumerate(distances)])
+    seen, pages = await all_pages(collection, 2)
+    assert sorted(seen) == list(range(len(distances)))
+    assert len(seen) == len(set(seen))
+    assert pages == 4
+
+
+@pytest.mark.asyncio
+async def test_single_page_has_no_cursor():
+    collection = GeoCollection([{"_id": 1, "distance_m": 3}])
+    assert await nearest_page(collection, NEAR, {}, 5) == ([{"_id": 1, "distance_m": 3}], None)
+
+
+@pytest.mark.asyncio
+async def test_malformed_geo_cursor_is_rejected():
+    with pytest.raises(InvalidPageRequest):
+        await nearest_page(GeoCollection([]), NEAR, {}, 5, "e30")  # "{}"
+
+
+@pytest.mark.asyncio
+async def test_shape_the_server_rejects_is_invalid_input():
+    crossing = OperationFailure("Loop is not valid: Edges 0 and 2 cross", code=2,
+                                details={"errmsg": "Loop is not valid: Edges 0 and 2 cross"})
+    with pytest.raises(InvalidShape, match="Edges 0 and 2 cross"):
+        await nearest_page(GeoCollection([], crossing), NEAR, {}, 5)
+    with pytest.raises(OperationFailure):
+        await nearest_page(GeoCollection([], OperationFailure("no geo index", code=291)), NEAR, {}, 5)
+
+
+def test_polygon_is_closed_and_range_checked():
+    assert parse_polygon("0,0;1,0;1,1")["coordinates"] == [[[0, 0], [1, 0], [1, 1], [0, 0]]]
+    with pytest.raises(ValueError, match="latitude"):
+        parse_polygon("0,0;1,0;1,91")
+    with pytest.raises(ValueError):
+        parse_polygon("0,0;1,0")
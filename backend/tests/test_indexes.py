@@ -0,0 +1,31 @@
+import pytest
+
+from services.indexes import ensure_indexes
+
+
+@pytest.mark.asyncio
+async def test_replaced_index_is_dropped_once_its_replacement_exists(db):
+    await db.customers.create_index("email", name="email")
+    report = await ensure_indexes(db)
+    assert report["failed"] == []
+    assert report["dropped"] == ["customers.email"]
+    assert "email_unique" in await db.customers.index_information()
+    assert (await ensure_indexes(db))["dropped"] == []
+
+
+@pytest.mark.asyncio
+async def test_replaced_index_stays_while_its_replacement_cannot_be_built(db):
+    await db.customers.insert_many([{"email": "a@x.io", "external_id": "c1"}, {"email": "a@x.io", "external_id": "c2"}])
+    await db.customers.create_index("email", name="email")
+    report = await ensure_indexes(db)
+    assert [failure.split(":")[0] for failure in report["failed"]] == ["customers.email_unique"]
+    assert report["dropped"] == []
+    assert "email" in await db.customers.index_information()
+
+
+@pytest.mark.asyncio
+async def test_city_collation_index_gives_way_to_city_normalized(db):
+    await db.properties.create_index("city", name="city_ci")
+    report = await ensure_indexes(db)
+    assert "properties.city_ci" in report["dropped"]
+    assert "city_ci" not in await db.properties.index_information()
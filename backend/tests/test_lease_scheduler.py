@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from services.lease_scheduler import RENEWALS, expire_leases, queue_renewals, run_once
+
+NOW = datetime(2024, 6, 1, 9, 30)
+
+
+def lease(days_left, status="active"):
+    return {"_id": ObjectId(), "status": status, "lease_end": datetime(2024, 6, 1) + timedelta(days=days_left),
+            "property_id": "p1", "tenant_id": "c1", "monthly_rent": 1000}
+
+
+async def states(db):
+    return {entry["_id"]: entry["state"] async for entry in db[RENEWALS].find()}
+
+
+@pytest.mark.asyncio
+async def test_expire_leases_flips_only_active_leases_that_ended(db):
+    ended = [lease(-days) for days in range(1, 6)]
+    ending_today, terminated = lease(0), lease(-3, status="terminated")
+    await db.leases.insert_many([*ended, ending_today, terminated])
+
+    assert await expire_leases(db, NOW, batch_size=2) == 5
+    statuses = {doc["_id"]: doc["status"] async for doc in db.leases.find()}
+    assert all(statuses[doc["_id"]] == "expired" for doc in ended)
+    assert statuses[ending_today["_id"]] == "active"
+    assert statuses[terminated["_id"]] == "terminated"
+    assert await expire_leases(db, NOW) == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_follows_the_notice_window_across_batches(db):
+    # Equal end dates straddle the batch boundary, so paging must break ties on _id
+    soon = [lease(10) for _ in range(5)]
+    later = lease(90)
+    await db.leases.insert_many([*soon, later])
+
+    report = await queue_renewals(db, notice_days=30, now=NOW, batch_size=2)
+    assert report == {"queued": 5, "expired": 0, "cancelled": 0}
+    assert await states(db) == {doc["_id"]: "pending" for doc in soon}
+
+    # Same leases next pass: nothing new queued
+    assert (await queue_renewals(db, 30, NOW + timedelta(hours=1), 2))["queued"] == 0
+
+    extended = soon[0]
+    await db.leases.update_one({"_id": extended["_id"]}, {"$set": {"lease_end": datetime(2025, 6, 1)}})
+    report = await queue_renewals(db, 30, NOW + timedelta(hours=2), 2)
+    assert report == {"queued": 0, "expired": 0, "cancelled": 1}
+    entry = await db[RENEWALS].find_one({"_id": extended["_id"]})
+    assert entry["state"] == "cancelled" and entry["closed_at"] == NOW + timedelta(hours=2)
+
+    # Extended back into the window: pending again, and no longer closed
+    await db.leases.update_one({"_id": extended["_id"]}, {"$set": {"lease_end": datetime(2024, 6, 20)}})
+    await queue_renewals(db, 30, NOW + timedelta(hours=3), 2)
+    entry = await db[RENEWALS].find_one({"_id": extended["_id"]})
+    assert entry["state"] == "pending" and "closed_at" not in entry
+    assert entry["queued_at"] == NOW
+    assert set((await states(db)).values()) == {"pending"}
+
+
+@pytest.mark.asyncio
+async def test_an_overlapping_older_pass_does_not_sweep_newer_entries(db):
+    current = lease(5)
+    await db.leases.insert_one(current)
+    await queue_renewals(db, 30, NOW + timedelta(minutes=5))
+    # A pass that started earlier finishes its upserts later
+    await queue_renewals(db, 30, NOW)
+    entry = await db[RENEWALS].find_one({"_id": current["_id"]})
+    assert entry["seen_at"] == NOW + timedelta(minutes=5)
+    assert entry["state"] == "pending"
+
+
+@pytest.mark.asyncio
+async def test_run_once_expires_leases_and_closes_their_queue_entries(db):
+    ending = lease(3)
+    await db.leases.insert_one(ending)
+    await run_once(db, notice_days=30, now=NOW)
+
+    report = await run_once(db, notice_days=30, now=NOW + timedelta(days=5))
+    assert report == {"leases_expired": 1, "queued": 0, "expired": 1, "cancelled": 0}
+    assert await states(db) == {ending["_id"]: "expired"}
+    assert (await db.leases.find_one({"_id": ending["_id"]}))["status"] == "expired"
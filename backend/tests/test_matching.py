@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from services.matching import MATCHES, PropertySnapshot, match_all_customers, stored_matches
+
+CUSTOMER = {"_id": ObjectId(), "budget_min": 200, "budget_max": 400, "city": "Austin"}
+
+
+def listing(price, **fields):
+    return {"_id": ObjectId(), "status": "available", "price": price, "area": 1000, "property_type": "house",
+            "city": "Austin", **fields}
+
+
+@pytest.mark.asyncio
+async def test_applied_writes_match_a_rebuild(db):
+    kept, sold, moved = listing(300), listing(250), listing(900)
+    await db.properties.insert_many([dict(kept), dict(sold), dict(moved)])
+    snapshot = PropertySnapshot()
+    await snapshot.rebuild(db.properties)
+
+    added = listing(350, city="Dallas")
+    changes = [(None, added), (sold, {"status": "sold"}), (moved, {"price": 320})]
+    await db.properties.insert_one(dict(added))
+    await db.properties.update_one({"_id": sold["_id"]}, {"$set": {"status": "sold"}})
+    await db.properties.update_one({"_id": moved["_id"]}, {"$set": {"price": 320}})
+    snapshot.apply_changes(changes)
+
+    rebuilt = PropertySnapshot()
+    await rebuilt.rebuild(db.properties)
+    assert snapshot.match(CUSTOMER) == rebuilt.match(CUSTOMER)
+    assert [doc_id for doc_id, _ in snapshot.match(CUSTOMER)] == [kept["_id"], moved["_id"], added["_id"]]
+
+
+@pytest.mark.asyncio
+async def test_stored_matches_are_served_while_current(db):
+    listings = [listing(price) for price in (250, 300, 350)]
+    await db.properties.insert_many([dict(doc) for doc in listings])
+    await db.customers.insert_one(dict(CUSTOMER))
+    snapshot = PropertySnapshot()
+    await snapshot.rebuild(db.properties)
+    report = await match_all_customers(db, snapshot, limit=2)
+
+    assert report["customers"] == 1
+    assert await stored_matches(db, CUSTOMER, 2) == snapshot.match(CUSTOMER, 2)
+    assert await stored_matches(db, CUSTOMER, 1) == snapshot.match(CUSTOMER, 1)
+    # The run stopped at two, so it cannot say what comes third
+    assert await stored_matches(db, CUSTOMER, 3) is None
+    edited = {**CUSTOMER, "updated_at": report["started_at"] + timedelta(seconds=1)}
+    assert await stored_matches(db, edited, 2) is None
+    assert await stored_matches(db, {"_id": ObjectId()}) is None
+
+
+@pytest.mark.asyncio
+async def test_short_stored_rankings_answer_any_limit(db):
+    await db[MATCHES].insert_one({"_id": CUSTOMER["_id"], "matches": [{"property_id": 1, "score": 0.9}],
+                                  "limit": 10, "computed_at": datetime(2024, 1, 1)})
+    assert await stored_matches(db, CUSTOMER, 50) == [(1, 0.9)]
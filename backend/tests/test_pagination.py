@@ -0,0 +1,52 @@
+import pytest
+from bson import ObjectId
+
+from services.pagination import (
+    InvalidPageRequest, decode_cursor, encode_cursor, encode_token, keyset_filter, parse_sort,
+)
+
+
+def test_parse_sort_ends_with_id():
+    assert parse_sort(None, ["price"]) == [("_id", 1)]
+    assert parse_sort("-price", ["price"]) == [("price", -1), ("_id", -1)]
+    assert parse_sort("_id", ["price"]) == [("_id", 1)]
+    with pytest.raises(InvalidPageRequest):
+        parse_sort("owner", ["price"])
+
+
+def test_keyset_filter_single_key():
+    oid = ObjectId()
+    assert keyset_filter([("_id", 1)], [oid]) == {"_id": {"$gt": oid}}
+    assert keyset_filter([("_id", -1)], [oid]) == {"_id": {"$lt": oid}}
+
+
+def test_keyset_filter_breaks_ties_on_later_keys():
+    oid = ObjectId()
+    assert keyset_filter([("price", -1), ("_id", -1)], [500, oid]) == {"$or": [
+        {"price": {"$lt": 500}},
+        {"price": 500, "_id": {"$lt": oid}},
+    ]}
+
+
+def test_cursor_round_trip():
+    spec = [("price", 1), ("_id", 1)]
+    doc = {"_id": ObjectId(), "price": 250000.5, "title": "Loft"}
+    assert decode_cursor(encode_cursor(spec, doc), spec) == [250000.5, doc["_id"]]
+
+
+def test_cursor_from_another_sort_is_rejected():
+    doc = {"_id": ObjectId(), "price": 1}
+    cursor = encode_cursor([("price", 1), ("_id", 1)], doc)
+    with pytest.raises(InvalidPageRequest, match="sort order"):
+        decode_cursor(cursor, [("price", -1), ("_id", -1)])
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_token({"v": [1]}),
+    encode_token({"s": [["_id", 1]], "v": [1, 2]}),
+    "WzFd",  # a JSON list, not an object
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(cursor, [("_id", 1)])
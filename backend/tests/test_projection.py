@@ -0,0 +1,33 @@
+import pytest
+
+from services.projection import InvalidProjection, parse_fields, project
+
+ALLOWED = ["title", "price", "description", "images"]
+PRESETS = {"card": {"title": 1, "price": 1, "images": {"$slice": 1}}}
+
+
+def test_no_fields_means_whole_documents():
+    assert parse_fields(None, ALLOWED, PRESETS) is None
+    assert parse_fields("", ALLOWED, PRESETS) is None
+
+
+def test_fields_and_presets_combine():
+    assert parse_fields("card, description", ALLOWED, PRESETS) == {
+        "title": 1, "price": 1, "images": {"$slice": 1}, "description": 1,
+    }
+
+
+def test_id_alone_still_projects():
+    assert parse_fields("id", ALLOWED, PRESETS) == {"_id": 1}
+    assert parse_fields(" ,id,", ALLOWED, PRESETS) == {"_id": 1}
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(InvalidProjection, match="owner_ssn"):
+        parse_fields("title,owner_ssn", ALLOWED, PRESETS)
+
+
+def test_project_matches_the_database_projection():
+    doc = {"_id": 1, "title": "Loft", "price": 10, "images": ["a", "b"], "description": "x"}
+    assert project(doc, PRESETS["card"]) == {"_id": 1, "title": "Loft", "price": 10, "images": ["a"]}
+    assert project(doc, None) is doc